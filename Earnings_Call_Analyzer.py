@@ -1,16 +1,29 @@
 
 
 import asyncio
+import contextvars
 import json
 import os
 import base64
 import time
 import re
+import statistics
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Deque, Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 
+from metric_extractor import extract_metrics, prompt_context, prefill_key_metrics, is_placeholder
+from tone_analyzer import analyze_tone, to_analysis, prompt_context as tone_context
+from sample_catalog import SampleCatalog, DEFAULT_SAMPLE_DIR
+from single_flight import SingleFlight, content_key
+from client_pool import POOL
+from call_scheduler import SCHEDULER, CALL_CONTEXT
+from bulk_consensus import verdict_for, recommendation_for, weighted_score as consensus_score, red_flags as consensus_red_flags
+from token_budget import TokenBudgetPlanner, count_tokens
+from near_duplicate import signature as near_duplicate_signature
+
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
 
 OLLAMA_AVAILABLE = False
@@ -67,6 +80,16 @@ if not ANTHROPIC_API_KEY and __name__ == "__main__" and not os.environ.get("SKIP
 USE_REAL_API = bool(ANTHROPIC_API_KEY)
 USE_OLLAMA = OLLAMA_AVAILABLE and not USE_REAL_API
 
+# Bump when agent prompts change so stored reports can be compared like-for-like
+PROMPT_VERSION = "2"
+
+# How often a worker checks whether another worker finished a shared analysis
+SHARED_POLL_SECONDS = 0.1
+
+# A request joins an identical in-flight analysis only if that one stops no later than the
+# request's own deadline and at most this many seconds before it
+FLIGHT_DEADLINE_WINDOW = float(os.environ.get("FLIGHT_DEADLINE_WINDOW", "5"))
+
 if USE_REAL_API:
     try:
         import anthropic
@@ -79,72 +102,6 @@ elif USE_OLLAMA:
 else:
     print(" Demo mode - Use samples for instant results")
 
-SAMPLE_ANALYSES = {
-    "techcorp_q3_2025": {
-        "company": "TechCorp Inc - Q3 2025",
-        "revenue": {
-            "score": 8.2,
-            "verdict": "STRONG",
-            "key_metrics": {
-                "revenue": "$2.8B (up 23% YoY)",
-                "guidance": "$3.2B next quarter (beat consensus)",
-                "customer_growth": "+1,200 enterprise customers",
-                "arr": "$10.5B (up 27% YoY)"
-            },
-            "highlights": [
-                "Revenue beat analyst estimates by $150M (5.7%)",
-                "Strong international growth - EMEA up 31% YoY",
-                "Raised full-year guidance from $11B to $11.5B",
-                "Enterprise segment growing faster than SMB"
-            ],
-            "concerns": [
-                "Customer acquisition costs increased 12%",
-                "SMB segment growth slowing (8% vs 15% last quarter)"
-            ]
-        },
-        "profitability": {
-            "score": 6.5,
-            "verdict": "MIXED",
-            "key_metrics": {
-                "gross_margin": "72% (down from 74%)",
-                "operating_margin": "18% (down from 21%)",
-                "net_income": "$420M (up 8% YoY)",
-                "free_cash_flow": "$580M (up 22%)"
-            },
-            "highlights": [
-                "Operating expenses well-controlled, up only 9% vs 23% revenue growth",
-                "Free cash flow beat expectations significantly",
-                "R&D efficiency improving"
-            ],
-            "concerns": [
-                "Gross margin compression due to infrastructure costs",
-                "Operating margin trending down for 3 consecutive quarters",
-                "Q4 guidance implies further margin compression to 16%"
-            ]
-        },
-        "management": {
-            "score": 7.8,
-            "verdict": "CONFIDENT",
-            "key_metrics": {
-                "tone": "Bullish and confident",
-                "defensiveness": "Low",
-                "transparency": "8.5/10"
-            },
-            "highlights": [
-                "CEO used 'confident' 12 times, 'excited' 8 times",
-                "Specific details on Q4 pipeline - $800M qualified deals",
-                "CEO bought $2M shares last month",
-                "Directly addressed margin pressure with concrete plan"
-            ],
-            "concerns": [
-                "Avoided question about Microsoft competition",
-                "Mentioned 'macroeconomic headwinds' 5 times",
-                "Vague on international expansion timeline"
-            ]
-        }
-    }
-}
-
 class MessageType(Enum):
     ANALYSIS = "analysis"
     CHALLENGE = "challenge"
@@ -160,13 +117,86 @@ class Message:
     data: Optional[Dict] = None
     timestamp: float = field(default_factory=lambda: datetime.now().timestamp())
 
+class OverflowPolicy(Enum):
+    BLOCK = "block"              # publisher waits for room (backpressure)
+    DROP_NEWEST = "drop_newest"  # incoming message is discarded
+    DROP_OLDEST = "drop_oldest"  # oldest queued message is discarded
+
+
+class Subscription:
+
+    def __init__(self, agent_id: str, maxsize: int, policy: OverflowPolicy):
+        self.agent_id = agent_id
+        self.maxsize = maxsize
+        self.policy = policy
+        self.callbacks: List = []
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.pending = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        # Queues and consumer tasks belong to the running loop, so (re)create them lazily
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.task = asyncio.ensure_future(self._consume())
+
+    async def _consume(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                await asyncio.gather(*[callback(message) for callback in self.callbacks])
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"  [bus] {self.agent_id} failed to handle {message.msg_type.value}: {e}")
+            finally:
+                self.pending -= 1
+                self.queue.task_done()
+
+    async def put(self, message: Message):
+        if self.policy == OverflowPolicy.BLOCK:
+            # Counted only once queued: a publisher cancelled while blocked must not leave pending > 0
+            await self.queue.put(message)
+            self.pending += 1
+            return
+
+        if self.queue.full():
+            self.dropped += 1
+            if self.policy == OverflowPolicy.DROP_NEWEST:
+                return
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.pending -= 1
+        self.pending += 1
+        self.queue.put_nowait(message)
+
+
 class MessageBus:
 
-    def __init__(self):
-        self.messages: List[Message] = []
-        self.subscribers: Dict[str, List] = {}
+    def __init__(
+        self,
+        queue_size: int = 100,
+        policy: OverflowPolicy = OverflowPolicy.BLOCK,
+        history_size: int = 1000
+    ):
+        # Only recent messages are kept for inspection
+        self.messages: Deque[Message] = deque(maxlen=history_size)
+        self.subscribers: Dict[str, Subscription] = {}
+        self.queue_size = queue_size
+        self.policy = policy
+        self._loop = None
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            for subscription in self.subscribers.values():
+                subscription.start()
 
     async def publish(self, message: Message):
+        self._ensure_running()
         self.messages.append(message)
 
         if "all" in message.recipients:
@@ -174,18 +204,113 @@ class MessageBus:
         else:
             recipients = message.recipients
 
-        for recipient in recipients:
-            if recipient in self.subscribers and recipient != message.sender:
-                for callback in self.subscribers[recipient]:
-                    await callback(message)
+        # Enqueue for every recipient at once; only a full BLOCK queue makes the publisher wait
+        await asyncio.gather(*[
+            self.subscribers[recipient].put(message)
+            for recipient in recipients
+            if recipient in self.subscribers and recipient != message.sender
+        ])
 
-    def subscribe(self, agent_id: str, callback):
+    def subscribe(
+        self,
+        agent_id: str,
+        callback,
+        queue_size: int = None,
+        policy: OverflowPolicy = None
+    ):
         if agent_id not in self.subscribers:
-            self.subscribers[agent_id] = []
-        self.subscribers[agent_id].append(callback)
+            subscription = Subscription(agent_id, queue_size or self.queue_size, policy or self.policy)
+            self.subscribers[agent_id] = subscription
+            if self._loop is not None and self._loop.is_running():
+                subscription.start()
+        self.subscribers[agent_id].callbacks.append(callback)
+
+    async def drain(self):
+        # Wait until every message published so far has been handled
+        if self._loop is not asyncio.get_running_loop():
+            return
+        while any(s.pending for s in self.subscribers.values()):
+            await asyncio.gather(*[s.queue.join() for s in self.subscribers.values()])
+
+    flush = drain
+
+    async def close(self):
+        tasks = [s.task for s in self.subscribers.values() if s.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+
+    def stats(self) -> Dict:
+        return {
+            agent_id: {
+                "queued": s.queue.qsize() if s.queue else 0,
+                "delivered": s.delivered,
+                "dropped": s.dropped,
+                "errors": s.errors
+            }
+            for agent_id, s in self.subscribers.items()
+        }
 
     def get_history(self) -> List[Message]:
-        return self.messages
+        return list(self.messages)
+
+MODELS = {
+    "claude": {
+        "fast": os.environ.get("CLAUDE_FAST_MODEL", "claude-3-5-haiku-20241022"),
+        "strong": os.environ.get("CLAUDE_MODEL", "claude-sonnet-4-20250514")
+    },
+    "ollama": {
+        "fast": os.environ.get("OLLAMA_FAST_MODEL", "llama3.2"),
+        "strong": os.environ.get("OLLAMA_MODEL", "llama3.1")
+    },
+    "mock": {"fast": "mock", "strong": "mock"}
+}
+
+
+class ModelCascade:
+    # Per-agent fast-then-strong model tiers and how often each tier answers
+
+    def __init__(self, agents: List[str] = None, disagreement: float = 2.0):
+        # agents: ids that start on the fast tier; None or [] means cascade is off
+        self.agents = set(agents or [])
+        self.disagreement = disagreement
+        self.stats_by_agent: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> "ModelCascade":
+        spec = os.environ.get("CASCADE_AGENTS", "").strip()
+        if spec.lower() == "all":
+            agents = ["*"]
+        else:
+            agents = [a.strip() for a in spec.split(",") if a.strip()]
+        return cls(agents, float(os.environ.get("CASCADE_DISAGREEMENT", "2.0")))
+
+    def enabled(self, agent_id: str) -> bool:
+        return "*" in self.agents or agent_id in self.agents
+
+    def record(self, agent_id: str, event: str):
+        counts = self.stats_by_agent.setdefault(agent_id, {})
+        counts[event] = counts.get(event, 0) + 1
+
+    def stats(self) -> Dict:
+        return {
+            "enabled_for": sorted(self.agents),
+            "disagreement_threshold": self.disagreement,
+            "agents": self.stats_by_agent
+        }
+
+
+# Model tokens recorded per budget key during the current analysis; EarningsAnalyzer sets a fresh dict per run
+RUN_USAGE: contextvars.ContextVar = contextvars.ContextVar("run_usage", default=None)
+# Calls of the current analysis whose answer was replaced by fallback / mock text after a backend failure
+RUN_FALLBACKS: contextvars.ContextVar = contextvars.ContextVar("run_fallbacks", default=None)
+
+
+def note_fallback(reason: str):
+    fallbacks = RUN_FALLBACKS.get()
+    if fallbacks is not None:
+        fallbacks.append(reason)
 
 class AIAPI:
 
@@ -193,24 +318,94 @@ class AIAPI:
         self.use_real = USE_REAL_API and api_key
         self.use_ollama = use_ollama or (USE_OLLAMA and not self.use_real)
 
+        # Async clients: cancelling the awaiting task aborts the in-flight HTTP request.
+        # Clients come from the process-wide pool so connections are reused across sessions.
+        self.pool = POOL
+        # Model calls wait here for a slot by priority class and tenant fair share
+        self.scheduler = SCHEDULER
         if self.use_real:
-            self.client = anthropic.Anthropic(api_key=api_key)
+            self.client = self.pool.anthropic(api_key)
         elif self.use_ollama:
             try:
-                import ollama
-                self.ollama = ollama
+                self.ollama = self.pool.ollama()
             except ImportError:
                 print(" Ollama not available, using mock")
                 self.use_ollama = False
 
+        self.planner = TokenBudgetPlanner(self.backend)
+        self.models = MODELS[self.backend]
+        self.cascade = ModelCascade.from_env()
+
+    def _record(self, budget_key: str, input_tokens: int, output_tokens: int, **kwargs):
+        self.planner.record(budget_key, input_tokens, output_tokens, **kwargs)
+        usage = RUN_USAGE.get()
+        if usage is not None:
+            usage[budget_key] = usage.get(budget_key, 0) + input_tokens + output_tokens
+
+    @property
+    def backend(self) -> str:
+        if self.use_real:
+            return "claude"
+        elif self.use_ollama:
+            return "ollama"
+        return "mock"
+
+    async def warm_up(self):
+        # Tiny request so the model is loaded (Ollama) or the TLS connection is open (Claude)
+        tiers = ["fast", "strong"] if self.cascade.agents else ["strong"]
+        for tier in tiers:
+            if self.use_real:
+                await asyncio.wait_for(
+                    self.client.messages.create(
+                        model=self.models[tier],
+                        max_tokens=1,
+                        messages=[{"role": "user", "content": "ok"}]
+                    ),
+                    timeout=self.pool.config.total_timeout
+                )
+            elif self.use_ollama:
+                await asyncio.wait_for(
+                    self.ollama.chat(
+                        model=self.models[tier],
+                        messages=[{'role': 'user', 'content': 'ok'}],
+                        options={'num_predict': 1},
+                        keep_alive=self.pool.config.ollama_keep_alive
+                    ),
+                    timeout=self.pool.config.total_timeout
+                )
+
     async def analyze_document(
         self,
         system_prompt: str,
         user_prompt: str,
         document_base64: str = None,
         document_type: str = "application/pdf",
-        max_tokens: int = 3000
+        max_tokens: int = 3000,
+        fallback: Optional[str] = None,
+        budget_key: str = None,
+        tier: str = "strong"
+    ) -> str:
+        async with self.scheduler.slot():
+            return await self._call_model(
+                system_prompt, user_prompt, document_base64, document_type,
+                max_tokens, fallback, budget_key, tier
+            )
+
+    async def _call_model(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        document_base64: str = None,
+        document_type: str = "application/pdf",
+        max_tokens: int = 3000,
+        fallback: Optional[str] = None,
+        budget_key: str = None,
+        tier: str = "strong"
     ) -> str:
+        # budget_key: record actual token usage for this agent in the planner
+        # tier: "fast" or "strong" model for the active backend
+        started = time.perf_counter()
+        model = self.models.get(tier, self.models["strong"])
 
         # MODE 1: Claude API
         if self.use_real:
@@ -229,13 +424,24 @@ class AIAPI:
 
                 content.append({"type": "text", "text": user_prompt})
 
-                response = self.client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=max_tokens,
-                    system=system_prompt,
-                    messages=[{"role": "user", "content": content}]
+                response = await asyncio.wait_for(
+                    self.client.messages.create(
+                        model=model,
+                        max_tokens=max_tokens,
+                        system=system_prompt,
+                        messages=[{"role": "user", "content": content}]
+                    ),
+                    timeout=self.pool.config.total_timeout
                 )
 
+                if budget_key:
+                    self._record(
+                        budget_key,
+                        response.usage.input_tokens,
+                        response.usage.output_tokens,
+                        seconds=time.perf_counter() - started,
+                        truncated=response.stop_reason == "max_tokens"
+                    )
                 return response.content[0].text
 
             except Exception as e:
@@ -244,7 +450,10 @@ class AIAPI:
                 print(f"  Falling back to mock.")
                 import traceback
                 traceback.print_exc()
-                return self._mock_response(user_prompt)
+                # A failed fast-tier call escalates to the strong model rather than being used
+                if tier != "fast":
+                    note_fallback(budget_key or "call")
+                return fallback if fallback is not None else self._mock_response(user_prompt)
 
         # MODE 2: Ollama (Free Local AI)
         elif self.use_ollama:
@@ -252,21 +461,47 @@ class AIAPI:
                 full_prompt = f"{system_prompt}\n\n{user_prompt}"
 
                 print("  Calling Ollama (local AI)...")
-                response = self.ollama.chat(
-                    model='llama3.1',
-                    messages=[{'role': 'user', 'content': full_prompt}]
+                response = await asyncio.wait_for(
+                    self.ollama.chat(
+                        model=model,
+                        messages=[{'role': 'user', 'content': full_prompt}],
+                        options={'num_predict': max_tokens},
+                        keep_alive=self.pool.config.ollama_keep_alive
+                    ),
+                    timeout=self.pool.config.total_timeout
                 )
 
-                return response['message']['content']
+                text = response['message']['content']
+                if budget_key:
+                    try:
+                        input_tokens = response['prompt_eval_count'] or count_tokens(full_prompt)
+                        output_tokens = response['eval_count'] or count_tokens(text)
+                        truncated = response['done_reason'] == 'length'
+                    except (KeyError, TypeError):
+                        input_tokens, output_tokens = count_tokens(full_prompt), count_tokens(text)
+                        truncated = False
+                    self._record(
+                        budget_key, input_tokens, output_tokens,
+                        seconds=time.perf_counter() - started, truncated=truncated
+                    )
+                return text
 
             except Exception as e:
                 print(f"  Ollama Error: {e}. Falling back to mock.")
-                return self._mock_response(user_prompt)
+                if tier != "fast":
+                    note_fallback(budget_key or "call")
+                return fallback if fallback is not None else self._mock_response(user_prompt)
 
         # MODE 3: Mock (for demo/testing)
         else:
+            # A locally computed answer stands in for the model instantly
+            if fallback is not None:
+                return fallback
             await asyncio.sleep(0.8)
-            return self._mock_response(user_prompt)
+            text = self._mock_response(user_prompt)
+            if budget_key:
+                self._record(budget_key, count_tokens(system_prompt + user_prompt), count_tokens(text))
+            return text
 
     def _mock_response(self, prompt: str) -> str:
         print(f"  Using mock response for: {prompt[:50]}...")
@@ -353,7 +588,7 @@ def clean_ollama_json(json_str: str) -> str:
 
     return json_str
 
-def safe_json_parse(response: str, fallback_prompt: str, ai_instance) -> dict:
+def extract_json(response: str) -> Optional[dict]:
     try:
         # Strategy 1: Direct JSON parse
         return json.loads(response)
@@ -381,9 +616,72 @@ def safe_json_parse(response: str, fallback_prompt: str, ai_instance) -> dict:
     except Exception as e:
         print(f"  All JSON parse strategies failed: {e}")
         print(f"  Raw response preview: {response[:300]}...")
-        return json.loads(ai_instance._mock_response(fallback_prompt))
+        return None
+
+def safe_json_parse(response: str, fallback_prompt: str, ai_instance) -> dict:
+    parsed = extract_json(response)
+    if isinstance(parsed, dict):
+        return parsed
+    if ai_instance.backend != "mock":
+        note_fallback(f"{fallback_prompt}:unparsable")
+    return json.loads(ai_instance._mock_response(fallback_prompt))
+
+def validate_analysis(analysis: Optional[dict], required_metrics: List[str]) -> Optional[str]:
+    # Returns why an agent's output is unusable, or None if it passes
+    if not isinstance(analysis, dict):
+        return "invalid_json"
+    try:
+        score = float(analysis.get("score"))
+    except (TypeError, ValueError):
+        return "missing_score"
+    if not 0.0 <= score <= 10.0:
+        return "score_out_of_range"
+    if not isinstance(analysis.get("verdict"), str):
+        return "missing_verdict"
+    key_metrics = analysis.get("key_metrics")
+    if required_metrics and not isinstance(key_metrics, dict):
+        return "missing_metrics"
+    for name in required_metrics:
+        if is_placeholder(key_metrics.get(name, "")):
+            return "missing_metrics"
+    return None
+
+@dataclass
+class AgentSpec:
+    agent_id: str
+    cls: type
+    weight: float
+    report_key: str
+    inputs: List[str]
+    review_inputs: List[str]
+
+
+AGENT_REGISTRY: Dict[str, AgentSpec] = {}
+
+
+def register_agent(cls):
+    # Class decorator: agents declare their id, weight and inputs as class attributes
+    AGENT_REGISTRY[cls.AGENT_ID] = AgentSpec(
+        agent_id=cls.AGENT_ID,
+        cls=cls,
+        weight=cls.WEIGHT,
+        report_key=cls.REPORT_KEY,
+        inputs=list(cls.INPUTS),
+        review_inputs=list(cls.REVIEW_INPUTS)
+    )
+    return cls
+
 
 class EarningsAgent:
+    AGENT_ID = ""
+    REPORT_KEY = ""
+    WEIGHT = 0.0
+    # key_metrics that must be present for a fast-tier answer to be accepted
+    REQUIRED_METRICS: List[str] = []
+    # "document" or other agent ids whose analyses analyze() needs
+    INPUTS = ["document"]
+    # Agent ids whose analyses review() needs once this agent's own analysis is done
+    REVIEW_INPUTS: List[str] = []
 
     def __init__(
         self,
@@ -397,9 +695,13 @@ class EarningsAgent:
         self.message_bus = message_bus
         self.ai = ai_api
 
+        self.weight = self.WEIGHT
         self.analysis: Dict = {}
         self.score: float = 0.0
-        self.inbox: List[Message] = []
+        self.inbox: Deque[Message] = deque(maxlen=100)
+        self.challenges: List[Message] = []
+        self.tier = "strong"
+        self.force_strong = False
 
         self.message_bus.subscribe(agent_id, self.receive_message)
 
@@ -440,24 +742,108 @@ class EarningsAgent:
             content=concern
         )
 
+    async def review(self, upstream: Dict[str, Dict]):
+        pass
+
+    async def _query(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        document_base64: str = None,
+        fallback: Optional[str] = None
+    ) -> Dict:
+        # Fast model first when cascading; escalate if the answer fails validation
+        cascade = self.ai.cascade
+        tiers = ["strong"]
+        if cascade.enabled(self.agent_id) and not self.force_strong and self.ai.backend != "mock":
+            tiers = ["fast", "strong"]
+
+        for tier in tiers:
+            response = await self.ai.analyze_document(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                document_base64=document_base64,
+                # A failed fast call comes back empty and escalates instead of using the fallback
+                fallback="" if tier == "fast" else fallback,
+                max_tokens=self.ai.planner.max_tokens(self.agent_id),
+                budget_key=self.agent_id,
+                tier=tier
+            )
+            parsed = extract_json(response)
+            problem = validate_analysis(parsed, self.REQUIRED_METRICS)
+            if tier == "fast" and problem:
+                print(f"  [{self.agent_id}] Fast model answer rejected ({problem}), escalating")
+                cascade.record(self.agent_id, f"escalated_{problem}")
+                continue
+            self.tier = tier
+            if len(tiers) > 1 or self.force_strong:
+                cascade.record(self.agent_id, f"answered_{tier}")
+            break
+
+        if isinstance(parsed, dict):
+            return parsed
+        return safe_json_parse(response, self.REPORT_KEY, self.ai)
+
     async def handle_challenge(self, message: Message):
+        # Challenges are answered in the next debate round, not inline
         print(f"  [{self.agent_id}] Received challenge: {message.content}")
+        self.challenges.append(message)
 
-        import random
-        if random.random() > 0.7:
-            old_score = self.score
-            self.score *= 0.9
+    async def revise(self, challenges: List[Message], document_text: str = None) -> Dict:
+        concerns = "\n".join(f"- {m.sender}: {m.content}" for m in challenges)
+        prompt = f"""
+        You previously produced this {self.expertise.lower()} of an earnings report:
+        {json.dumps(self.analysis)}
+
+        Peer analysts challenged it:
+        {concerns}
+
+        Re-examine the evidence. Keep your score if the concern is not supported,
+        otherwise adjust it. Return ONLY the revised JSON object with the same structure.
+        """
+
+        budget_key = f"{self.agent_id}:revise"
+        if document_text:
+            excerpt = self.ai.planner.fit_document(budget_key, prompt, document_text)
+            prompt = f"{prompt}\n\nDocument text:\n{excerpt}"
+
+        response = await self.ai.analyze_document(
+            system_prompt=f"You are a {self.expertise.lower()} expert responding to peer review.",
+            user_prompt=prompt,
+            max_tokens=self.ai.planner.max_tokens(budget_key),
+            fallback=json.dumps(self.analysis),
+            budget_key=budget_key
+        )
+
+        revised = safe_json_parse(response, self.REPORT_KEY, self.ai)
+        try:
+            score = float(revised.get('score', self.score))
+        except (TypeError, ValueError):
+            score = self.score
+
+        old_score = self.score
+        self.analysis = {**self.analysis, **revised, "score": score}
+        self.score = score
+        if old_score != score:
             print(f"  [{self.agent_id}] Revised score: {old_score:.1f} → {self.score:.1f}")
 
+        return self.analysis
+
+@register_agent
 class RevenueAgent(EarningsAgent):
+    AGENT_ID = "revenue_agent"
+    REPORT_KEY = "revenue"
+    WEIGHT = 0.40
+    REQUIRED_METRICS = ["revenue"]
 
     def __init__(self, message_bus: MessageBus, ai_api: AIAPI):
-        super().__init__("revenue_agent", "Revenue Analysis", message_bus, ai_api)
+        super().__init__(self.AGENT_ID, "Revenue Analysis", message_bus, ai_api)
 
     async def analyze(
         self,
         document_text: str = None,
-        document_base64: str = None
+        document_base64: str = None,
+        upstream: Dict[str, Dict] = None
     ) -> Dict:
         print(f"\n[{self.agent_id}] Analyzing revenue metrics...")
 
@@ -491,16 +877,20 @@ class RevenueAgent(EarningsAgent):
         Return ONLY the JSON object. No markdown formatting. No explanations.
         """
 
+        facts = extract_metrics(document_text)
+        prompt += prompt_context(facts, "revenue")
+
+        # Document excerpt and reply size come from the token budget planner
         if document_text:
-            prompt = f"{prompt}\n\nDocument text:\n{document_text[:3000]}"
+            excerpt = self.ai.planner.fit_document(self.agent_id, prompt, document_text)
+            prompt = f"{prompt}\n\nDocument text:\n{excerpt}"
 
-        response = await self.ai.analyze_document(
+        analysis = await self._query(
             system_prompt="You are a revenue analysis expert for public companies. Focus on top-line growth.",
             user_prompt=prompt,
             document_base64=document_base64
         )
-
-        analysis = safe_json_parse(response, "revenue", self.ai)
+        analysis = prefill_key_metrics(analysis, facts, "revenue")
 
         self.analysis = analysis
         try:
@@ -509,20 +899,26 @@ class RevenueAgent(EarningsAgent):
             self.score = 7.0
 
         await self.broadcast_analysis(analysis)
-        await asyncio.sleep(0.3)
 
         return analysis
 
 
+@register_agent
 class ProfitabilityAgent(EarningsAgent):
+    AGENT_ID = "profitability_agent"
+    REPORT_KEY = "profitability"
+    WEIGHT = 0.35
+    REQUIRED_METRICS = ["gross_margin", "operating_margin"]
+    REVIEW_INPUTS = ["revenue_agent"]
 
     def __init__(self, message_bus: MessageBus, ai_api: AIAPI):
-        super().__init__("profitability_agent", "Profitability Analysis", message_bus, ai_api)
+        super().__init__(self.AGENT_ID, "Profitability Analysis", message_bus, ai_api)
 
     async def analyze(
         self,
         document_text: str = None,
-        document_base64: str = None
+        document_base64: str = None,
+        upstream: Dict[str, Dict] = None
     ) -> Dict:
         print(f"\n[{self.agent_id}] Analyzing profitability metrics...")
 
@@ -550,16 +946,20 @@ class ProfitabilityAgent(EarningsAgent):
         Return ONLY the JSON object. No markdown. No explanations.
         """
 
+        facts = extract_metrics(document_text)
+        prompt += prompt_context(facts, "profitability")
+
+        # Document excerpt and reply size come from the token budget planner
         if document_text:
-            prompt = f"{prompt}\n\nDocument text:\n{document_text[:3000]}"
+            excerpt = self.ai.planner.fit_document(self.agent_id, prompt, document_text)
+            prompt = f"{prompt}\n\nDocument text:\n{excerpt}"
 
-        response = await self.ai.analyze_document(
+        analysis = await self._query(
             system_prompt="You are a profitability analysis expert. Focus on margins and efficiency.",
             user_prompt=prompt,
             document_base64=document_base64
         )
-
-        analysis = safe_json_parse(response, "profitability", self.ai)
+        analysis = prefill_key_metrics(analysis, facts, "profitability")
 
         self.analysis = analysis
         try:
@@ -568,30 +968,39 @@ class ProfitabilityAgent(EarningsAgent):
             self.score = 6.5
 
         await self.broadcast_analysis(analysis)
-        await asyncio.sleep(0.3)
 
+        return analysis
+
+    async def review(self, upstream: Dict[str, Dict]):
         # Challenge revenue agent if needed
-        revenue_messages = [m for m in self.inbox if m.sender == "revenue_agent"]
-        if revenue_messages and self.score < 7.0:
-            revenue_data = revenue_messages[0].data
-            if revenue_data and revenue_data.get('score', 0) > 8.0:
+        revenue_data = upstream.get("revenue_agent")
+        if revenue_data and self.score < 7.0:
+            try:
+                revenue_score = float(revenue_data.get('score', 0))
+            except (TypeError, ValueError):
+                revenue_score = 0.0
+            if revenue_score > 8.0:
                 await self.challenge_peer(
                     "revenue_agent",
                     "Revenue growth is impressive, but margin compression is concerning."
                 )
 
-        return analysis
-
 
+@register_agent
 class ManagementAgent(EarningsAgent):
+    AGENT_ID = "management_agent"
+    REPORT_KEY = "management"
+    WEIGHT = 0.25
+    REQUIRED_METRICS = ["tone"]
 
     def __init__(self, message_bus: MessageBus, ai_api: AIAPI):
-        super().__init__("management_agent", "Management Analysis", message_bus, ai_api)
+        super().__init__(self.AGENT_ID, "Management Analysis", message_bus, ai_api)
 
     async def analyze(
         self,
         document_text: str = None,
-        document_base64: str = None
+        document_base64: str = None,
+        upstream: Dict[str, Dict] = None
     ) -> Dict:
         print(f"\n[{self.agent_id}] Analyzing management commentary...")
 
@@ -617,16 +1026,31 @@ class ManagementAgent(EarningsAgent):
         Return ONLY the JSON object. No markdown. No explanations.
         """
 
+        tone = analyze_tone(document_text)
+        prompt += tone_context(tone)
+
+        # Document excerpt and reply size come from the token budget planner
         if document_text:
-            prompt = f"{prompt}\n\nDocument text:\n{document_text[:3000]}"
+            excerpt = self.ai.planner.fit_document(self.agent_id, prompt, document_text)
+            prompt = f"{prompt}\n\nDocument text:\n{excerpt}"
 
-        response = await self.ai.analyze_document(
+        analysis = await self._query(
             system_prompt="You are an expert at reading executive communications. Detect confidence and red flags.",
             user_prompt=prompt,
-            document_base64=document_base64
+            document_base64=document_base64,
+            fallback=json.dumps(to_analysis(tone)) if tone else None
         )
-
-        analysis = safe_json_parse(response, "management", self.ai)
+        if tone:
+            # Exact counts override the model's estimate
+            if not isinstance(analysis.get("key_metrics"), dict):
+                analysis["key_metrics"] = {}
+            analysis["key_metrics"]["defensiveness"] = tone["defensiveness"]
+            analysis["tone_analysis"] = {
+                "category_counts": tone["category_counts"],
+                "top_phrases": dict(list(tone["phrase_counts"].items())[:10]),
+                "qa_deflections": tone["qa_deflections"],
+                "defensiveness_score": tone["defensiveness_score"]
+            }
 
         self.analysis = analysis
         try:
@@ -638,15 +1062,237 @@ class ManagementAgent(EarningsAgent):
 
         return analysis
 
+class AgentScheduler:
+    # Runs agents as a DAG: every step starts as soon as its inputs are ready
+
+    def __init__(self, agents: List[EarningsAgent]):
+        self.agents = {agent.agent_id: agent for agent in agents}
+        self.steps: Dict[str, List[str]] = {}
+        for agent in agents:
+            self.steps[agent.agent_id] = [i for i in agent.INPUTS if i != "document"]
+            if agent.REVIEW_INPUTS:
+                self.steps[f"{agent.agent_id}:review"] = [agent.agent_id] + list(agent.REVIEW_INPUTS)
+        self.order = self._topological_order()
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    def _topological_order(self) -> List[str]:
+        order, state = [], {}
+
+        def visit(step: str, path: List[str]):
+            if state.get(step) == "done":
+                return
+            if state.get(step) == "visiting":
+                raise ValueError(f"Agent dependency cycle: {' -> '.join(path + [step])}")
+            if step not in self.steps:
+                raise ValueError(f"Unknown agent input '{step}' required by {path[-1]}")
+            state[step] = "visiting"
+            for dep in self.steps[step]:
+                visit(dep, path + [step])
+            state[step] = "done"
+            order.append(step)
+
+        for step in self.steps:
+            visit(step, [])
+        return order
+
+    async def run(
+        self,
+        document_text: str = None,
+        document_base64: str = None,
+        timeout: float = None
+    ) -> Dict[str, Dict]:
+        # Returns analyses of the agents that finished; on timeout the rest are cancelled
+        loop = asyncio.get_running_loop()
+        futures = {step: loop.create_future() for step in self.order}
+        started = time.perf_counter()
+        self.timings = {}
+
+        async def run_step(step: str):
+            try:
+                deps = self.steps[step]
+                if deps:
+                    await asyncio.gather(*[futures[dep] for dep in deps])
+                upstream = {dep: futures[dep].result() for dep in deps}
+                self.timings[step] = {"start": time.perf_counter() - started}
+
+                agent_id, _, phase = step.partition(":")
+                agent = self.agents[agent_id]
+                if phase == "review":
+                    await agent.review(upstream)
+                    result = agent.analysis
+                else:
+                    result = await agent.analyze(
+                        document_text=document_text,
+                        document_base64=document_base64,
+                        upstream=upstream
+                    )
+                self.timings[step]["end"] = time.perf_counter() - started
+                futures[step].set_result(result)
+            except asyncio.CancelledError:
+                futures[step].cancel()
+                raise
+            except Exception as e:
+                if not futures[step].done():
+                    futures[step].set_exception(e)
+                raise
+
+        tasks = [asyncio.ensure_future(run_step(step)) for step in self.order]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            # Also reached when the caller is cancelled, so model calls never outlive the request
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+        return {
+            agent_id: futures[agent_id].result()
+            for agent_id in self.agents
+            if futures[agent_id].done() and not futures[agent_id].cancelled()
+            and futures[agent_id].exception() is None
+        }
+
+
+@dataclass
+class DebateBudget:
+    max_rounds: int = 2
+    max_tokens: int = 8000
+    max_seconds: float = 20.0
+    # Stop once no score moves by more than this in a round
+    convergence: float = 0.25
+
+    @classmethod
+    def from_env(cls) -> "DebateBudget":
+        defaults = cls()
+        return cls(
+            max_rounds=int(os.environ.get("DEBATE_MAX_ROUNDS", defaults.max_rounds)),
+            max_tokens=int(os.environ.get("DEBATE_MAX_TOKENS", defaults.max_tokens)),
+            max_seconds=float(os.environ.get("DEBATE_MAX_SECONDS", defaults.max_seconds)),
+            convergence=float(os.environ.get("DEBATE_CONVERGENCE", defaults.convergence))
+        )
+
+
+class DebateModerator:
+
+    def __init__(self, agents: List[EarningsAgent], message_bus: MessageBus, budget: DebateBudget = None):
+        self.agents = agents
+        self.message_bus = message_bus
+        self.budget = budget or DebateBudget()
+
+    @staticmethod
+    def _estimate_tokens(agent: EarningsAgent, document_tokens: int) -> int:
+        # A revision sends the current analysis plus a planner-sized document excerpt, then a reply
+        key = f"{agent.agent_id}:revise"
+        planner = agent.ai.planner
+        excerpt = min(document_tokens, planner.input_tokens(key)) if document_tokens else 0
+        return count_tokens(json.dumps(agent.analysis)) + excerpt + planner.max_tokens(key)
+
+    @staticmethod
+    def _revise_tokens() -> int:
+        # Tokens the backend reported for this run's revisions
+        usage = RUN_USAGE.get() or {}
+        return sum(tokens for key, tokens in usage.items() if key.endswith(":revise"))
+
+    async def run(self, document_text: str = None, max_seconds: float = None) -> Dict:
+        started = time.perf_counter()
+        if max_seconds is None:
+            max_seconds = self.budget.max_seconds
+        tokens_used = 0
+        baseline = self._revise_tokens()
+        document_tokens = count_tokens(document_text) if document_text else 0
+        rounds = []
+        stopped = "no_challenges"
+
+        for round_number in range(1, self.budget.max_rounds + 1):
+            await self.message_bus.drain()
+            challenged = [agent for agent in self.agents if agent.challenges]
+            if not challenged:
+                stopped = "no_challenges" if round_number == 1 else "converged"
+                break
+
+            estimate = sum(self._estimate_tokens(a, document_tokens) for a in challenged)
+            remaining = max_seconds - (time.perf_counter() - started)
+            if tokens_used + estimate > self.budget.max_tokens:
+                stopped = "token_budget"
+                break
+            if remaining <= 0:
+                stopped = "time_budget"
+                break
+
+            before = {agent.agent_id: agent.score for agent in challenged}
+            pending = {agent.agent_id: agent.challenges for agent in challenged}
+            for agent in challenged:
+                agent.challenges = []
+
+            tasks = [
+                asyncio.ensure_future(agent.revise(pending[agent.agent_id], document_text))
+                for agent in challenged
+            ]
+            try:
+                done, not_done = await asyncio.wait(tasks, timeout=remaining)
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+            for task in done:
+                if task.exception() is not None:
+                    print(f"  [debate] Revision failed: {task.exception()}")
+            tokens_used = self._revise_tokens() - baseline
+
+            moves = {a.agent_id: round(a.score - before[a.agent_id], 2) for a in challenged}
+            rounds.append({"round": round_number, "score_changes": moves})
+
+            if not_done:
+                stopped = "time_budget"
+                break
+
+            # Reviewers look at the revised analyses and may raise new challenges
+            analyses = {a.agent_id: a.analysis for a in self.agents}
+            await asyncio.gather(*[
+                a.review({dep: analyses[dep] for dep in a.REVIEW_INPUTS if dep in analyses})
+                for a in self.agents if a.REVIEW_INPUTS
+            ])
+
+            if max(abs(m) for m in moves.values()) <= self.budget.convergence:
+                stopped = "converged"
+                break
+        else:
+            stopped = "max_rounds"
+
+        # Anything still queued is left unanswered once the budget is spent
+        await self.message_bus.drain()
+        for agent in self.agents:
+            agent.challenges = []
+
+        return {
+            "rounds": rounds,
+            "stopped": stopped,
+            "tokens_used": tokens_used,
+            "seconds": round(time.perf_counter() - started, 2)
+        }
+
+
 class EarningsConsensus:
     def __init__(self, message_bus: MessageBus):
         self.message_bus = message_bus
+        # Challenges published before this time were superseded (cascade re-review)
+        self.challenges_since = 0.0
 
     async def build_consensus(self, agents: List[EarningsAgent]) -> Dict:
         print(f"\n{'='*60}")
         print("BUILDING CONSENSUS")
         print(f"{'='*60}\n")
 
+        # Let in-flight challenges settle before reading scores
+        await self.message_bus.drain()
+
         print("Agent Scores:")
         agent_scores = {}
         for agent in agents:
@@ -657,48 +1303,36 @@ class EarningsConsensus:
                 "verdict": verdict
             }
 
-        # Calculate weighted average
-        weights = {
-            'revenue_agent': 0.40,
-            'profitability_agent': 0.35,
-            'management_agent': 0.25
-        }
-
-        weighted_score = sum(
-            agent.score * weights[agent.agent_id]
-            for agent in agents
+        # Calculate weighted average (weights come from the agent registry), rounded the
+        # same way bulk re-scoring does so both land in the same verdict band
+        weighted_score = consensus_score(
+            [agent.score for agent in agents],
+            [agent.weight for agent in agents]
         )
 
-        # Determine verdict
-        if weighted_score >= 8.0:
-            verdict = "BEAT EXPECTATIONS - STRONG BUY"
-        elif weighted_score >= 7.0:
-            verdict = "MET EXPECTATIONS - HOLD/BUY"
-        elif weighted_score >= 6.0:
-            verdict = "MIXED RESULTS - HOLD"
-        elif weighted_score >= 5.0:
-            verdict = "MISSED EXPECTATIONS - HOLD/SELL"
-        else:
-            verdict = "POOR RESULTS - SELL"
-
-        # Check for red flags
-        red_flags = []
-        messages = self.message_bus.get_history()
-        challenges = [m for m in messages if m.msg_type == MessageType.CHALLENGE]
-        if len(challenges) >= 2:
-            red_flags.append("Multiple agents raised concerns")
+        # Verdict bands and red-flag rules are shared with bulk re-scoring (bulk_consensus)
+        verdict = verdict_for(weighted_score)
 
+        # One concern per (challenger, challenged) pair, however many debate rounds repeated it
+        challenges = {
+            (m.sender, tuple(m.recipients))
+            for m in self.message_bus.get_history()
+            if m.msg_type == MessageType.CHALLENGE and m.timestamp >= self.challenges_since
+        }
         profitability = next((a for a in agents if a.agent_id == "profitability_agent"), None)
         revenue = next((a for a in agents if a.agent_id == "revenue_agent"), None)
-        if profitability and revenue:
-            if profitability.score < 6.5 and revenue.score > 8.0:
-                red_flags.append("Strong revenue but weak margins - growth may not be profitable")
-
-        if not red_flags:
-            red_flags = ["None detected"]
+        management = next((a for a in agents if a.agent_id == "management_agent"), None)
+        tone = (management.analysis.get("tone_analysis") if management else None) or {}
+        red_flags = consensus_red_flags(
+            len(challenges),
+            revenue.score if revenue and profitability else None,
+            profitability.score if revenue and profitability else None,
+            tone.get("defensiveness_score"),
+            tone.get("qa_deflections", 0)
+        )
 
         consensus = {
-            "overall_score": round(weighted_score, 1),
+            "overall_score": weighted_score,
             "verdict": verdict,
             "confidence": "High" if len(challenges) == 0 else "Medium" if len(challenges) == 1 else "Low",
             "agent_scores": agent_scores,
@@ -714,41 +1348,62 @@ class EarningsConsensus:
         return consensus
 
     def _generate_recommendation(self, score: float, agents: List[EarningsAgent]) -> str:
-        if score >= 8.0:
-            return "Strong beat across the board. Consider buying on any dips."
-        elif score >= 7.0:
-            return "Solid results but not spectacular. Hold position or add on weakness."
-        elif score >= 6.0:
-            return "Mixed results. Monitor closely. Hold current position."
-        else:
-            return "Results fell short. Consider reducing position."
+        return recommendation_for(score)
+
+class AnalysisSession:
+    # Agents, bus, scheduler and debate for a single analysis, so concurrent
+    # requests on one analyzer never see each other's analyses or challenges
+
+    def __init__(self, ai_api: AIAPI, debate_budget: DebateBudget):
+        self.message_bus = MessageBus()
+        self.agents = [
+            spec.cls(self.message_bus, ai_api)
+            for spec in AGENT_REGISTRY.values()
+        ]
+        self.scheduler = AgentScheduler(self.agents)
+        self.debate = DebateModerator(self.agents, self.message_bus, debate_budget)
+        self.consensus_engine = EarningsConsensus(self.message_bus)
+
 
 class EarningsAnalyzer:
 
-    def __init__(self, api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        debate_budget: DebateBudget = None,
+        shared_state=None,
+        cache_ttl: float = 3600.0,
+        near_duplicates=None
+    ):
         self.ai_api = AIAPI(
             api_key=api_key or ANTHROPIC_API_KEY,
             use_ollama=USE_OLLAMA
         )
-        self.message_bus = MessageBus()
-        self.agents = [
-            RevenueAgent(self.message_bus, self.ai_api),
-            ProfitabilityAgent(self.message_bus, self.ai_api),
-            ManagementAgent(self.message_bus, self.ai_api)
-        ]
-        self.consensus_engine = EarningsConsensus(self.message_bus)
-        self.samples = SAMPLE_ANALYSES
+        self.debate_budget = debate_budget or DebateBudget.from_env()
+        # Message bus counters summed over finished sessions
+        self.bus_totals = {"analyses": 0, "active": 0, "delivered": 0, "dropped": 0, "errors": 0}
+        self.samples = SampleCatalog(os.environ.get("SAMPLE_DIR", DEFAULT_SAMPLE_DIR))
+        self.single_flight = SingleFlight()
+        # Deadline of each in-flight analysis by single-flight key
+        self.flight_deadlines: Dict[str, Optional[float]] = {}
+        # Optional cross-process cache and single-flight leases (shared_state.SharedState)
+        self.shared = shared_state
+        self.cache_ttl = cache_ttl
+        # Optional MinHash index that reuses reports of near-identical transcripts
+        # (near_duplicate.NearDuplicateIndex)
+        self.near_duplicates = near_duplicates
 
     async def analyze_document(
         self,
         file_path: str = None,
-        text_content: str = None
+        text_content: str = None,
+        deadline: float = None
     ) -> Dict:
-        print(f"\n{'='*60}")
-        print("EARNINGS ANALYZER - AGENT SWARM")
-        print(f"{'='*60}")
+        # deadline is an event-loop time; agents still running then are cancelled
+        # and the report is built from the ones that finished (marked partial)
 
         # Read file if provided
+        file_bytes = None
         document_base64 = None
         if file_path:
             print(f"Reading file: {file_path}")
@@ -756,29 +1411,237 @@ class EarningsAnalyzer:
                 file_bytes = f.read()
                 document_base64 = base64.b64encode(file_bytes).decode()
 
-        # Run agents
-        print("\n--- PHASE 1: AGENT ANALYSIS ---")
-        analyses = await asyncio.gather(*[
-            agent.analyze(
-                document_text=text_content,
-                document_base64=document_base64
-            )
-            for agent in self.agents
+        # The same call from another transcript vendor reuses its earlier analysis
+        index = self.near_duplicates if text_content and not file_bytes else None
+        scope = f"{self.ai_api.backend}:{PROMPT_VERSION}"
+        # MinHash and the index's SQLite reads / writes run off the event loop;
+        # the signature is computed once for both the lookup and the later add
+        loop = asyncio.get_running_loop()
+        if index is not None:
+            sig = await loop.run_in_executor(None, near_duplicate_signature, text_content)
+            reused = await loop.run_in_executor(None, index.lookup, text_content, scope, sig)
+            if reused is not None:
+                match = reused["near_duplicate"]
+                print(f"Near-duplicate of an analysed transcript (similarity {match['similarity']}), reusing its report")
+                return reused
+
+        # Identical concurrent requests share one in-flight analysis
+        key = content_key(text_content, file_bytes)
+        flight_key, flight_deadline = self._flight_for(key, deadline)
+        report = await self.single_flight.do(
+            flight_key,
+            lambda: self._run_shared(key, text_content, document_base64, flight_deadline)
+        )
+        reusable = not (report.get("partial") or report.get("degraded") or report.get("cached"))
+        if index is not None and reusable:
+            await loop.run_in_executor(None, index.add, text_content, scope, key, report, sig)
+        return report
+
+    def _flight_for(self, key: str, deadline: float = None) -> Tuple[str, Optional[float]]:
+        # A short-timeout caller must not truncate the report of a long-timeout one, and
+        # nobody may wait on a run that outlives their own deadline. The flight's model calls
+        # are scheduled in its first caller's priority class, so classes never share a flight:
+        # interactive requests must not queue behind a batch backfill of the same transcript
+        _, priority = CALL_CONTEXT.get()
+        prefix = f"{key}:{priority}:"
+        for flight_key, flight_deadline in list(self.flight_deadlines.items()):
+            if flight_key not in self.single_flight.flights:
+                del self.flight_deadlines[flight_key]
+            elif not flight_key.startswith(prefix):
+                continue
+            elif deadline is None and flight_deadline is None:
+                return flight_key, None
+            elif deadline is not None and flight_deadline is not None and (
+                deadline - FLIGHT_DEADLINE_WINDOW <= flight_deadline <= deadline
+            ):
+                return flight_key, flight_deadline
+        flight_key = f"{prefix}{deadline}"
+        self.flight_deadlines[flight_key] = deadline
+        return flight_key, deadline
+
+    async def _run_shared(
+        self,
+        key: str,
+        text_content: str = None,
+        document_base64: str = None,
+        deadline: float = None
+    ) -> Dict:
+        if self.shared is None:
+            return await self._run_analysis(text_content, document_base64, deadline)
+
+        # SharedState calls block on SQLite (up to its busy timeout), so keep them off the event loop
+        loop = asyncio.get_running_loop()
+
+        def shared(method, *args):
+            return loop.run_in_executor(None, method, *args)
+
+        cache_key = f"{key}:{self.ai_api.backend}:{PROMPT_VERSION}"
+        waited = False
+        while True:
+            cached = await shared(self.shared.cache_get, cache_key)
+            if cached is not None:
+                await shared(self.shared.incr, "result_cache_hits")
+                # Already stored by the worker that produced it
+                return {**cached, "cached": True}
+            if await shared(self.shared.try_acquire, cache_key):
+                break
+
+            # Another worker is analysing the same transcript; wait for its result
+            if not waited:
+                await shared(self.shared.incr, "shared_coalesced")
+                waited = True
+            while await shared(self.shared.in_flight, cache_key):
+                if await shared(self.shared.cache_get, cache_key) is not None:
+                    break
+                await asyncio.sleep(SHARED_POLL_SECONDS)
+
+        try:
+            await shared(self.shared.incr, "analyses_started")
+            report = await self._run_analysis(text_content, document_base64, deadline)
+            if not report.get("partial") and not report.get("degraded"):
+                await shared(self.shared.cache_put, cache_key, report, self.cache_ttl)
+            return report
+        finally:
+            await shared(self.shared.release, cache_key)
+
+    def message_bus_stats(self) -> Dict:
+        return dict(self.bus_totals)
+
+    async def _escalate_disagreements(
+        self,
+        session: AnalysisSession,
+        text_content: str = None,
+        document_base64: str = None,
+        timeout: float = None
+    ):
+        # Fast-tier answers far from the other agents' scores are redone on the strong model
+        cascade = self.ai_api.cascade
+        # Median, so one wild score does not make the agents it disagrees with look like outliers
+        median = statistics.median(agent.score for agent in session.agents)
+        outliers = [
+            agent for agent in session.agents
+            if agent.tier == "fast" and abs(agent.score - median) > cascade.disagreement
+        ]
+        if not outliers:
+            return
+
+        print(f"  [cascade] Escalating {', '.join(a.agent_id for a in outliers)} on disagreement")
+        for agent in outliers:
+            cascade.record(agent.agent_id, "escalated_disagreement")
+            agent.force_strong = True
+        analyses = {agent.agent_id: agent.analysis for agent in session.agents}
+        try:
+            await asyncio.wait_for(asyncio.gather(*[
+                agent.analyze(
+                    document_text=text_content,
+                    document_base64=document_base64,
+                    upstream={dep: analyses[dep] for dep in agent.INPUTS if dep in analyses}
+                )
+                for agent in outliers
+            ]), timeout)
+        except asyncio.TimeoutError:
+            print("  [cascade] Escalation ran out of time, keeping fast-tier answers")
+            return
+        finally:
+            for agent in outliers:
+                agent.force_strong = False
+
+        # Reviews see the strong-tier answers instead of the ones they replaced; challenges
+        # about the fast-tier answers are delivered first so none arrive after the reset
+        await session.message_bus.drain()
+        session.consensus_engine.challenges_since = datetime.now().timestamp()
+        analyses = {agent.agent_id: agent.analysis for agent in session.agents}
+        for agent in session.agents:
+            agent.challenges = []
+        await asyncio.gather(*[
+            a.review({dep: analyses[dep] for dep in a.REVIEW_INPUTS if dep in analyses})
+            for a in session.agents if a.REVIEW_INPUTS
         ])
 
+    async def _run_analysis(
+        self,
+        text_content: str = None,
+        document_base64: str = None,
+        deadline: float = None
+    ) -> Dict:
+        session = AnalysisSession(self.ai_api, self.debate_budget)
+        self.bus_totals["active"] += 1
+        usage_token = RUN_USAGE.set({})
+        fallbacks_token = RUN_FALLBACKS.set([])
+        try:
+            return await self._run_session(session, text_content, document_base64, deadline)
+        finally:
+            RUN_USAGE.reset(usage_token)
+            RUN_FALLBACKS.reset(fallbacks_token)
+            await session.message_bus.close()
+            self.bus_totals["active"] -= 1
+            self.bus_totals["analyses"] += 1
+            for counts in session.message_bus.stats().values():
+                for name in ("delivered", "dropped", "errors"):
+                    self.bus_totals[name] += counts[name]
+
+    async def _run_session(
+        self,
+        session: AnalysisSession,
+        text_content: str = None,
+        document_base64: str = None,
+        deadline: float = None
+    ) -> Dict:
+        loop = asyncio.get_running_loop()
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - loop.time())
+
+        print(f"\n{'='*60}")
+        print("EARNINGS ANALYZER - AGENT SWARM")
+        print(f"{'='*60}")
+
+        print("\n--- PHASE 1: AGENT ANALYSIS ---")
+        analyses = await session.scheduler.run(
+            document_text=text_content,
+            document_base64=document_base64,
+            timeout=remaining()
+        )
+        finished = [agent for agent in session.agents if agent.agent_id in analyses]
+        missing = [agent.agent_id for agent in session.agents if agent.agent_id not in analyses]
+        if not finished:
+            raise asyncio.TimeoutError("No agent finished before the deadline")
+
+        if not missing and self.ai_api.cascade.agents:
+            await self._escalate_disagreements(session, text_content, document_base64, remaining())
+
+        # Challenged agents revise concurrently within the debate budget
+        print("\n--- PHASE 2: DEBATE ---")
+        if missing:
+            debate = {"rounds": [], "stopped": "deadline", "tokens_used": 0, "seconds": 0.0}
+        else:
+            budget_seconds = session.debate.budget.max_seconds
+            if deadline is not None:
+                budget_seconds = min(budget_seconds, remaining())
+            debate = await session.debate.run(document_text=text_content, max_seconds=budget_seconds)
+
         # Build consensus
-        print("\n--- PHASE 2: CONSENSUS BUILDING ---")
-        consensus = await self.consensus_engine.build_consensus(self.agents)
+        print("\n--- PHASE 3: CONSENSUS BUILDING ---")
+        consensus = await session.consensus_engine.build_consensus(finished)
 
+        # The session's agents hold only this run's (possibly revised) analyses
         report = {
             "timestamp": datetime.now().isoformat(),
             "consensus": consensus,
             "detailed_analysis": {
-                "revenue": analyses[0],
-                "profitability": analyses[1],
-                "management": analyses[2]
-            }
+                agent.REPORT_KEY: agent.analysis
+                for agent in finished
+            },
+            "debate": debate
         }
+        if missing:
+            report["partial"] = True
+            report["missing_agents"] = missing
+        # Canned answers stood in for failed model calls; fine to return, not to reuse
+        fallbacks = RUN_FALLBACKS.get()
+        if fallbacks:
+            report["degraded"] = True
+            report["fallbacks"] = sorted(set(fallbacks))
 
         return report
 
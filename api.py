@@ -1,165 +1,348 @@
-
-
-import requests
-import json
-
-BASE_URL = "http://localhost:800133333333"
-
-
-def test_root():
-    print("\n" + "=" * 60)
-    print("TEST 1: Root Endpoint")
-    print("=" * 60)
-
-    try:
-        response = requests.get(f"{BASE_URL}/")
-        print(f"Status: {response.status_code}")
-        print(f"Response: {json.dumps(response.json(), indent=2)}")
-    except Exception as e:
-        print(f"Failed: {e}")
-        print("   Make sure backend is running: uvicorn api:app --reload")
-
-
-def test_health():
-    print("\n" + "=" * 60)
-    print("TEST 2: Health Check")
-    print("=" * 60)
-
-    try:
-        response = requests.get(f"{BASE_URL}/api/health")
-        data = response.json()
-        print(f"Status: {response.status_code}")
-        print(f"Components: {data['components']}")
-    except Exception as e:
-        print(f"Failed: {e}")
-
-
-def test_samples():
-    print("\n" + "=" * 60)
-    print("TEST 3: Get Samples")
-    print("=" * 60)
-
-    try:
-        response = requests.get(f"{BASE_URL}/api/samples")
-        data = response.json()
-        print(f"Status: {response.status_code}")
-        print(f"Found {data['count']} samples:")
-        for sample in data['samples']:
-            print(f"   - {sample['company']}: {sample['overall_score']}/10")
-    except Exception as e:
-        print(f"Failed: {e}")
-
-
-def test_sample_detail():
-    print("\n" + "=" * 60)
-    print("TEST 4: Get Sample Detail")
-    print("=" * 60)
-
-    try:
-        response = requests.get(f"{BASE_URL}/api/sample/techcorp_q3_2025")
-        data = response.json()
-        print(f"Status: {response.status_code}")
-        print(f"Company: {data['company']}")
-        print(f"Overall Score: {data['consensus']['overall_score']}/10")
-        print(f"Verdict: {data['consensus']['verdict']}")
-    except Exception as e:
-        print(f"Failed: {e}")
-
-
-def test_analyze_text():
-    print("\n" + "=" * 60)
-    print("TEST 5: Analyze Text (Full AI Analysis)")
-    print("=" * 60)
-
-    sample_transcript = """
-    Q3 2025 Earnings Call - Test Company Inc.
-
-    CEO: I'm pleased to report revenue of $3.2 billion, up 18% year-over-year.
-    This beat analyst estimates of $3.0 billion. We added 800 new customers.
-
-    CFO: Gross margin came in at 68%, down from 71% last quarter due to 
-    infrastructure investments. Operating margin was 15%. Free cash flow 
-    was strong at $450 million.
-
-    Q&A: We're confident about Q4 and expect continued growth momentum.
-    """
-
-    try:
-        print("Sending transcript to backend...")
-        response = requests.post(
-            f"{BASE_URL}/api/analyze",
-            json={"text": sample_transcript},
-            timeout=30  # AI analysis can take time
-        )
-
-        if response.status_code != 200:
-            print(f"❌ Error: {response.status_code}")
-            print(f"   {response.text}")
-            return
-
-        data = response.json()
-
-        print(f" Status: {response.status_code}")
-        print(f"\n RESULTS:")
-        print(f"   Overall Score: {data['consensus']['overall_score']}/10")
-        print(f"   Verdict: {data['consensus']['verdict']}")
-        print(f"   Confidence: {data['consensus']['confidence']}")
-        print(f"\n   Agent Scores:")
-        print(f"   - Revenue: {data['detailed_analysis']['revenue']['score']}/10")
-        print(f"   - Profitability: {data['detailed_analysis']['profitability']['score']}/10")
-        print(f"   - Management: {data['detailed_analysis']['management']['score']}/10")
-
-    except requests.exceptions.Timeout:
-        print(f"  Timeout: Analysis took too long (>30s)")
-        print(f"   This is normal for first Ollama run")
-    except Exception as e:
-        print(f" Failed: {e}")
-
-
-def test_invalid_input():
-    print("\n" + "=" * 60)
-    print("TEST 6: Error Handling")
-    print("=" * 60)
-
-    try:
-        # Test with too-short text
-        response = requests.post(
-            f"{BASE_URL}/api/analyze",
-            json={"text": "Short"}
-        )
-
-        if response.status_code == 400:
-            print(f" Correctly rejected short input")
-            print(f"   Error: {response.json()['detail']}")
-        else:
-            print(f"  Expected 400 error, got {response.status_code}")
-    except Exception as e:
-        print(f" Failed: {e}")
-
-
-def run_all_tests():
-    print("\n" + "=" * 60)
-    print("EARNINGS ANALYZER API - TEST SUITE")
-    print("=" * 60)
-    print(f"\nTesting backend at: {BASE_URL}")
-    print("Make sure backend is running first!")
-    print("=" * 60)
-
-    # Run tests
-    test_root()
-    test_health()
-    test_samples()
-    test_sample_detail()
-    test_analyze_text()
-    test_invalid_input()
-
-    print("\n" + "=" * 60)
-    print(" ALL TESTS COMPLETE")
-    print("=" * 60)
-    print("\nIf all tests passed, backend is working correctly!")
-    print("You can now connect your frontend.")
-    print("=" * 60 + "\n")
-
-
-if __name__ == "__main__":
+
+
+import requests
+import json
+
+BASE_URL = "http://localhost:800133333333"
+
+SAMPLE_TRANSCRIPT = """
+    Q3 2025 Earnings Call - Test Company Inc.
+
+    CEO: I'm pleased to report revenue of $3.2 billion, up 18% year-over-year.
+    This beat analyst estimates of $3.0 billion. We added 800 new customers.
+
+    CFO: Gross margin came in at 68%, down from 71% last quarter due to 
+    infrastructure investments. Operating margin was 15%. Free cash flow 
+    was strong at $450 million.
+
+    Q&A: We're confident about Q4 and expect continued growth momentum.
+    """
+
+
+def print_flags(data):
+    # Set by the server when a report is incomplete, reused or built from fallback answers
+    print(f"   Partial: {data.get('partial', False)} (missing: {data.get('missing_agents', [])})")
+    print(f"   Cached: {data.get('cached', False)}")
+    print(f"   Near-duplicate: {data.get('near_duplicate')}")
+    print(f"   Degraded: {data.get('degraded', False)} {data.get('fallbacks', '')}")
+    print(f"   Stored as report: {data.get('report_id')}")
+
+
+def test_root():
+    print("\n" + "=" * 60)
+    print("TEST 1: Root Endpoint")
+    print("=" * 60)
+
+    try:
+        response = requests.get(f"{BASE_URL}/")
+        print(f"Status: {response.status_code}")
+        print(f"Response: {json.dumps(response.json(), indent=2)}")
+    except Exception as e:
+        print(f"Failed: {e}")
+        print("   Make sure backend is running: uvicorn api:app --reload")
+
+
+def test_health():
+    print("\n" + "=" * 60)
+    print("TEST 2: Health Check")
+    print("=" * 60)
+
+    try:
+        response = requests.get(f"{BASE_URL}/api/health")
+        data = response.json()
+        print(f"Status: {response.status_code}")
+        print(f"Components: {data['components']}")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def test_samples():
+    print("\n" + "=" * 60)
+    print("TEST 3: Get Samples")
+    print("=" * 60)
+
+    try:
+        response = requests.get(f"{BASE_URL}/api/samples")
+        data = response.json()
+        print(f"Status: {response.status_code}")
+        print(f"Found {data['count']} samples:")
+        for sample in data['samples']:
+            print(f"   - {sample['company']}: {sample['overall_score']}/10")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def test_sample_detail():
+    print("\n" + "=" * 60)
+    print("TEST 4: Get Sample Detail")
+    print("=" * 60)
+
+    try:
+        response = requests.get(f"{BASE_URL}/api/sample/techcorp_q3_2025")
+        data = response.json()
+        print(f"Status: {response.status_code}")
+        print(f"Company: {data['company']}")
+        print(f"Overall Score: {data['consensus']['overall_score']}/10")
+        print(f"Verdict: {data['consensus']['verdict']}")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def test_analyze_text():
+    print("\n" + "=" * 60)
+    print("TEST 5: Analyze Text (Full AI Analysis)")
+    print("=" * 60)
+
+    sample_transcript = SAMPLE_TRANSCRIPT
+
+    try:
+        print("Sending transcript to backend...")
+        response = requests.post(
+            f"{BASE_URL}/api/analyze",
+            # Ask the server to stop (and return partial results) before our own timeout
+            json={"text": sample_transcript, "timeout_seconds": 25},
+            timeout=30  # AI analysis can take time
+        )
+
+        if response.status_code != 200:
+            print(f"❌ Error: {response.status_code}")
+            print(f"   {response.text}")
+            return
+
+        data = response.json()
+
+        print(f" Status: {response.status_code}")
+        print(f"\n RESULTS:")
+        print(f"   Overall Score: {data['consensus']['overall_score']}/10")
+        print(f"   Verdict: {data['consensus']['verdict']}")
+        print(f"   Confidence: {data['consensus']['confidence']}")
+        print(f"\n   Agent Scores:")
+        print(f"   - Revenue: {data['detailed_analysis']['revenue']['score']}/10")
+        print(f"   - Profitability: {data['detailed_analysis']['profitability']['score']}/10")
+        print(f"   - Management: {data['detailed_analysis']['management']['score']}/10")
+        print_flags(data)
+        return data
+
+    except requests.exceptions.Timeout:
+        print(f"  Timeout: Analysis took too long (>30s)")
+        print(f"   This is normal for first Ollama run")
+    except Exception as e:
+        print(f" Failed: {e}")
+
+
+def test_invalid_input():
+    print("\n" + "=" * 60)
+    print("TEST 6: Error Handling")
+    print("=" * 60)
+
+    try:
+        # Test with too-short text
+        response = requests.post(
+            f"{BASE_URL}/api/analyze",
+            json={"text": "Short"}
+        )
+
+        if response.status_code == 400:
+            print(f" Correctly rejected short input")
+            print(f"   Error: {response.json()['detail']}")
+        else:
+            print(f"  Expected 400 error, got {response.status_code}")
+
+        # Unknown priority class
+        response = requests.post(
+            f"{BASE_URL}/api/analyze",
+            json={"text": SAMPLE_TRANSCRIPT, "priority": "urgent"}
+        )
+        if response.status_code == 400:
+            print(f" Correctly rejected unknown priority")
+        else:
+            print(f"  Expected 400 error, got {response.status_code}")
+    except Exception as e:
+        print(f" Failed: {e}")
+
+
+def test_ready():
+    print("\n" + "=" * 60)
+    print("TEST 7: Readiness")
+    print("=" * 60)
+
+    try:
+        response = requests.get(f"{BASE_URL}/api/ready")
+        print(f"Status: {response.status_code} ({'ready' if response.status_code == 200 else 'warming up'})")
+        if response.status_code == 200:
+            print(f"Warm-up: {response.json()['warmup']}")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def test_metrics():
+    print("\n" + "=" * 60)
+    print("TEST 8: Metrics")
+    print("=" * 60)
+
+    try:
+        response = requests.get(f"{BASE_URL}/api/metrics")
+        data = response.json()
+        print(f"Status: {response.status_code}")
+        print(f"Worker: {data['worker_pid']}")
+        print(f"Shared counters: {data['shared']}")
+        for name, stats in data["local"].items():
+            print(f"   - {name}: {json.dumps(stats)[:100]}")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def test_repeat_analysis():
+    print("\n" + "=" * 60)
+    print("TEST 9: Repeat Analysis (cache / near-duplicate reuse)")
+    print("=" * 60)
+
+    try:
+        # The same call with different spacing is reused, not analysed or stored again
+        response = requests.post(
+            f"{BASE_URL}/api/analyze",
+            json={"text": "  " + SAMPLE_TRANSCRIPT.replace("\n\n", "\n"), "timeout_seconds": 25},
+            timeout=30
+        )
+        data = response.json()
+        print(f"Status: {response.status_code}")
+        print_flags(data)
+        if data.get("cached") or data.get("near_duplicate"):
+            if data.get("report_id") is None:
+                print(f" Reused report was not stored again")
+            else:
+                print(f"  Reused report was stored again as {data['report_id']}")
+        else:
+            print(f"  Expected a cached or near-duplicate report (is NEAR_DUP or SHARED_STATE_DB off?)")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def test_partial_deadline():
+    print("\n" + "=" * 60)
+    print("TEST 10: Deadline (partial report)")
+    print("=" * 60)
+
+    try:
+        # A deadline too short for every agent: partial report (not stored) or 504.
+        # A different call, so it isn't answered from the cache or near-duplicate index
+        text = """
+    Q2 2025 Earnings Call - Deadline Test Corp.
+
+    CEO: Revenue was $910 million, down 4% year-over-year, below guidance.
+    Churn rose and we paused hiring in two regions.
+
+    CFO: Operating expenses grew 9%. Net loss was $35 million and free cash
+    flow was negative $20 million. We are withdrawing full-year guidance.
+    """
+        response = requests.post(
+            f"{BASE_URL}/api/analyze",
+            json={"text": text, "timeout_seconds": 0.5},
+            timeout=30
+        )
+        print(f"Status: {response.status_code}")
+        if response.status_code == 200:
+            data = response.json()
+            print_flags(data)
+            if data.get("partial") and data.get("report_id") is not None:
+                print(f"  Partial report was stored")
+        elif response.status_code != 504:
+            print(f"  Expected 200 (partial) or 504, got {response.status_code}")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def test_report_history(report=None):
+    print("\n" + "=" * 60)
+    print("TEST 11: Report History")
+    print("=" * 60)
+
+    try:
+        if report and report.get("report_id") is not None:
+            response = requests.get(f"{BASE_URL}/api/reports/{report['report_id']}")
+            print(f"Stored report {report['report_id']}: {response.status_code}, "
+                  f"score {response.json()['consensus']['overall_score']}")
+
+        response = requests.get(f"{BASE_URL}/api/reports/999999999")
+        print(f"Unknown report: {response.status_code} (expected 404)")
+
+        # Case, punctuation and legal suffix don't matter
+        for company in ("Test Company Inc", "test company inc.", "Test Company"):
+            data = requests.get(f"{BASE_URL}/api/companies/{company}/trend").json()
+            print(f"Trend for '{company}': {data['count']} period(s)")
+            for point in data["trend"][:3]:
+                print(f"   - {point['fiscal_period']}: {point['overall_score']}/10 ({point['verdict']})")
+
+        data = requests.get(f"{BASE_URL}/api/periods/Q3 2025/ranking", params={"n": 5}).json()
+        print(f"Top reports for Q3 2025: {data['count']}")
+        for entry in data["reports"]:
+            print(f"   - {entry['company']}: {entry['overall_score']}/10")
+
+        response = requests.get(f"{BASE_URL}/api/periods/Q3 2025/ranking", params={"order": "middle"})
+        print(f"Invalid order: {response.status_code} (expected 400)")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def test_rescore():
+    print("\n" + "=" * 60)
+    print("TEST 12: Re-score Stored Reports")
+    print("=" * 60)
+
+    try:
+        response = requests.post(
+            f"{BASE_URL}/api/rescore",
+            json={
+                "fiscal_period": "Q3 2025",
+                "weight_sets": {"revenue_heavy": {"revenue": 0.6, "profitability": 0.25, "management": 0.15}},
+                "n": 5
+            }
+        )
+        data = response.json()
+        print(f"Status: {response.status_code}")
+        print(f"Reports re-scored: {data['reports']} in {data['ms']}")
+        for name, ranking in data["rankings"].items():
+            print(f"   {name}:")
+            for entry in ranking:
+                print(f"   - {entry['company']}: {entry['stored_score']} -> {entry['overall_score']} ({entry['verdict']})")
+
+        response = requests.post(f"{BASE_URL}/api/rescore", json={"weight_sets": {"bad": {"guidance": 1.0}}})
+        print(f"Unknown section: {response.status_code} (expected 400)")
+        response = requests.post(f"{BASE_URL}/api/rescore", json={"apply": "missing"})
+        print(f"Unknown weight set to apply: {response.status_code} (expected 400)")
+    except Exception as e:
+        print(f"Failed: {e}")
+
+
+def run_all_tests():
+    print("\n" + "=" * 60)
+    print("EARNINGS ANALYZER API - TEST SUITE")
+    print("=" * 60)
+    print(f"\nTesting backend at: {BASE_URL}")
+    print("Make sure backend is running first!")
+    print("=" * 60)
+
+    # Run tests
+    test_root()
+    test_health()
+    test_samples()
+    test_sample_detail()
+    report = test_analyze_text()
+    test_invalid_input()
+    test_ready()
+    test_metrics()
+    test_repeat_analysis()
+    test_partial_deadline()
+    test_report_history(report)
+    test_rescore()
+
+    print("\n" + "=" * 60)
+    print(" ALL TESTS COMPLETE")
+    print("=" * 60)
+    print("\nIf all tests passed, backend is working correctly!")
+    print("You can now connect your frontend.")
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
     run_all_tests()
\ No newline at end of file
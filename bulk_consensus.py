@@ -0,0 +1,213 @@
+import json
+import math
+from typing import Dict, List, Optional, Sequence
+
+NUMPY_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    pass
+
+# (minimum weighted score, verdict, recommendation), best band first
+VERDICT_BANDS = [
+    (8.0, "BEAT EXPECTATIONS - STRONG BUY", "Strong beat across the board. Consider buying on any dips."),
+    (7.0, "MET EXPECTATIONS - HOLD/BUY", "Solid results but not spectacular. Hold position or add on weakness."),
+    (6.0, "MIXED RESULTS - HOLD", "Mixed results. Monitor closely. Hold current position."),
+    (5.0, "MISSED EXPECTATIONS - HOLD/SELL", "Results fell short. Consider reducing position."),
+    (-math.inf, "POOR RESULTS - SELL", "Results fell short. Consider reducing position."),
+]
+
+# Red-flag rules shared by the per-report and bulk consensus
+MULTIPLE_CHALLENGES = 2
+STRONG_REVENUE = 8.0
+WEAK_MARGINS = 6.5
+DEFENSIVE_TONE = 6.0
+
+RED_FLAG_TEXT = {
+    "multiple_challenges": "Multiple agents raised concerns",
+    "growth_without_margins": "Strong revenue but weak margins - growth may not be profitable",
+    "defensive_tone": "Defensive management tone - {deflections} deflected answer(s) in Q&A",
+}
+
+# Stored reports keep the challenge count only as the consensus confidence
+CONFIDENCE_CHALLENGES = {"High": 0, "Medium": 1, "Low": 2}
+
+
+def round_score(score):
+    # Half-up to one decimal with plain float ops, so a float and a numpy array round identically
+    if NUMPY_AVAILABLE and isinstance(score, np.ndarray):
+        return np.floor(score * 10 + 0.5) / 10
+    return math.floor(score * 10 + 0.5) / 10
+
+
+def weighted_score(scores: Sequence[float], weights: Sequence[float]) -> float:
+    # The consensus score: sum of score * weight / total weight in agent order, rounded
+    # before it is banded. build_consensus and both ScoreMatrix paths must agree exactly
+    total = sum(weights)
+    if total <= 0:
+        return math.nan
+    return round_score(sum(s * w / total for s, w in zip(scores, weights)))
+
+
+def band_for(score: float) -> int:
+    return next(i for i, (minimum, _, _) in enumerate(VERDICT_BANDS) if score >= minimum)
+
+
+def verdict_for(score: float) -> str:
+    return VERDICT_BANDS[band_for(score)][1]
+
+
+def recommendation_for(score: float) -> str:
+    return VERDICT_BANDS[band_for(score)][2]
+
+
+def red_flags(
+    challenges: int,
+    revenue: Optional[float],
+    profitability: Optional[float],
+    defensiveness: Optional[float],
+    deflections: int = 0
+) -> List[str]:
+    flags = []
+    if challenges >= MULTIPLE_CHALLENGES:
+        flags.append(RED_FLAG_TEXT["multiple_challenges"])
+    if revenue is not None and profitability is not None:
+        if profitability < WEAK_MARGINS and revenue > STRONG_REVENUE:
+            flags.append(RED_FLAG_TEXT["growth_without_margins"])
+    if defensiveness is not None and defensiveness >= DEFENSIVE_TONE:
+        flags.append(RED_FLAG_TEXT["defensive_tone"].format(deflections=deflections))
+    return flags or ["None detected"]
+
+
+class ScoreMatrix:
+    # Agent scores of many stored reports, one row per report and one column per agent report key;
+    # missing agents are NaN and drop out of that row's weights
+
+    def __init__(self, columns: Sequence[str], rows: List[Dict]):
+        self.columns = list(columns)
+        self.meta = [
+            {k: row[k] for k in ("id", "company", "fiscal_period", "overall_score", "verdict")}
+            for row in rows
+        ]
+        scores = [[_number(row[c]) for c in self.columns] for row in rows]
+        challenges = [CONFIDENCE_CHALLENGES.get(row["confidence"], 0) for row in rows]
+        defensiveness = [_number(row["defensiveness"]) for row in rows]
+        self.deflections = [int(row["deflections"] or 0) for row in rows]
+        if NUMPY_AVAILABLE:
+            self.scores = np.array(scores, dtype=np.float64).reshape(len(rows), len(self.columns))
+            self.challenges = np.array(challenges, dtype=np.int64)
+            self.defensiveness = np.array(defensiveness, dtype=np.float64)
+        else:
+            self.scores, self.challenges, self.defensiveness = scores, challenges, defensiveness
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+    def _column(self, name: str):
+        return self.columns.index(name) if name in self.columns else None
+
+    def rescore(self, weights: Dict[str, float]) -> Dict:
+        # One pass over every report: weighted score, verdict band and red-flag masks
+        if NUMPY_AVAILABLE:
+            return self._rescore_numpy(weights)
+        return self._rescore_python(weights)
+
+    def _rescore_numpy(self, weights: Dict[str, float]) -> Dict:
+        w = np.array([weights.get(c, 0.0) for c in self.columns], dtype=np.float64)
+        present = ~np.isnan(self.scores)
+        weights_present = np.where(present, w, 0.0)
+        # Column by column, in the same order and with the same operations as weighted_score
+        total = np.zeros(len(self))
+        for j in range(len(self.columns)):
+            total = total + weights_present[:, j]
+        weighted = np.zeros(len(self))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for j in range(len(self.columns)):
+                weighted = weighted + np.where(present[:, j], self.scores[:, j] * w[j] / total, 0.0)
+            overall = np.where(total > 0, round_score(weighted), np.nan)
+
+        # Bands are best-first, so count how many minimums each score falls short of
+        minimums = np.array([b[0] for b in VERDICT_BANDS[:-1]])
+        bands = (np.nan_to_num(overall, nan=-np.inf)[:, None] < minimums[None, :]).sum(axis=1)
+
+        nan = np.full(len(self), np.nan)
+        revenue = self.scores[:, self._column("revenue")] if "revenue" in self.columns else nan
+        profitability = self.scores[:, self._column("profitability")] if "profitability" in self.columns else nan
+        with np.errstate(invalid="ignore"):
+            flags = {
+                "multiple_challenges": self.challenges >= MULTIPLE_CHALLENGES,
+                "growth_without_margins": (profitability < WEAK_MARGINS) & (revenue > STRONG_REVENUE),
+                "defensive_tone": self.defensiveness >= DEFENSIVE_TONE,
+            }
+        return {"overall_score": overall, "band": bands, "flags": flags}
+
+    def _rescore_python(self, weights: Dict[str, float]) -> Dict:
+        overall, bands = [], []
+        flags = {name: [] for name in RED_FLAG_TEXT}
+        rev, prof = self._column("revenue"), self._column("profitability")
+        for i, row in enumerate(self.scores):
+            present = [(s, weights.get(c, 0.0)) for c, s in zip(self.columns, row) if not math.isnan(s)]
+            score = weighted_score([s for s, _ in present], [w for _, w in present])
+            overall.append(score)
+            bands.append(band_for(score) if not math.isnan(score) else len(VERDICT_BANDS) - 1)
+            revenue = row[rev] if rev is not None else math.nan
+            profitability = row[prof] if prof is not None else math.nan
+            flags["multiple_challenges"].append(self.challenges[i] >= MULTIPLE_CHALLENGES)
+            flags["growth_without_margins"].append(profitability < WEAK_MARGINS and revenue > STRONG_REVENUE)
+            flags["defensive_tone"].append(self.defensiveness[i] >= DEFENSIVE_TONE)
+        return {"overall_score": overall, "band": bands, "flags": flags}
+
+    def entry(self, result: Dict, i: int) -> Dict:
+        flags = [
+            RED_FLAG_TEXT[name].format(deflections=self.deflections[i])
+            for name in RED_FLAG_TEXT if result["flags"][name][i]
+        ]
+        band = VERDICT_BANDS[int(result["band"][i])]
+        return {
+            **self.meta[i],
+            "stored_score": self.meta[i]["overall_score"],
+            "stored_verdict": self.meta[i]["verdict"],
+            "overall_score": float(result["overall_score"][i]),
+            "verdict": band[1],
+            "recommendation": band[2],
+            "red_flags": flags or ["None detected"],
+        }
+
+    def rank(self, weights: Dict[str, float], n: int = 10, bottom: bool = False) -> List[Dict]:
+        result = self.rescore(weights)
+        overall = result["overall_score"]
+        if NUMPY_AVAILABLE:
+            # Only sort the reports that make the cut
+            keyed = np.where(np.isnan(overall), np.inf, overall if bottom else -overall)
+            valid = int((~np.isnan(overall)).sum())
+            n = min(n, valid)
+            if n <= 0:
+                return []
+            top = np.argpartition(keyed, n - 1)[:n] if n < len(keyed) else np.arange(len(keyed))
+            order = top[np.argsort(keyed[top], kind="stable")][:n].tolist()
+        else:
+            valid = [i for i, s in enumerate(overall) if not math.isnan(s)]
+            order = sorted(valid, key=lambda i: overall[i], reverse=not bottom)[:n]
+        return [self.entry(result, i) for i in order]
+
+    def updates(self, weights: Dict[str, float]) -> List[tuple]:
+        # (overall_score, verdict, recommendation, red_flags json, id) rows for ReportStore.update_consensus
+        result = self.rescore(weights)
+        rows = []
+        for i in range(len(self)):
+            if math.isnan(float(result["overall_score"][i])):
+                continue
+            entry = self.entry(result, i)
+            rows.append((
+                entry["overall_score"], entry["verdict"], entry["recommendation"],
+                json.dumps(entry["red_flags"]), entry["id"]
+            ))
+        return rows
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
@@ -0,0 +1,227 @@
+import asyncio
+import contextvars
+import hashlib
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# (tenant, priority) of the work running in the current task; set per request
+CALL_CONTEXT: contextvars.ContextVar = contextvars.ContextVar("call_context", default=("default", "interactive"))
+
+
+def tenant_id(
+    api_key: str = None,
+    tenant: str = None,
+    fallback: str = "default",
+    known: Optional[Dict[str, float]] = None
+) -> str:
+    # A claimed tenant name is unauthenticated, so it is only honoured for configured
+    # tenants (known); anything else would dodge the per-tenant quota by renaming itself.
+    # API keys are only ever shown as a short hash
+    if tenant and known is not None and tenant in known:
+        return tenant
+    if api_key:
+        return "key-" + hashlib.sha1(api_key.encode()).hexdigest()[:8]
+    return fallback
+
+
+@contextmanager
+def call_context(tenant: str = "default", priority: str = "interactive"):
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}', expected one of {sorted(PRIORITIES)}")
+    token = CALL_CONTEXT.set((tenant, priority))
+    try:
+        yield
+    finally:
+        CALL_CONTEXT.reset(token)
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    # SCHED_TENANT_WEIGHTS: "acme=3,backfill=0.5"
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+@dataclass
+class SchedulerConfig:
+    # Model calls in flight across all tenants (keep at or below the backend pool size)
+    max_concurrent: int = 8
+    # Model calls in flight for any one tenant
+    tenant_quota: int = 4
+    # A queued call moves up one priority class per aging_seconds spent waiting
+    aging_seconds: float = 15.0
+    tenant_weights: Dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls) -> "SchedulerConfig":
+        defaults = cls()
+        return cls(
+            max_concurrent=int(os.environ.get("SCHED_MAX_CONCURRENT", defaults.max_concurrent)),
+            tenant_quota=int(os.environ.get("SCHED_TENANT_QUOTA", defaults.tenant_quota)),
+            aging_seconds=float(os.environ.get("SCHED_AGING_SECONDS", defaults.aging_seconds)),
+            tenant_weights=parse_weights(os.environ.get("SCHED_TENANT_WEIGHTS", ""))
+        )
+
+
+class Waiter:
+
+    def __init__(self, tenant: str, priority: str, tag: float, seq: int):
+        self.tenant = tenant
+        self.priority = priority
+        self.tag = tag
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+    def effective_priority(self, now: float, aging_seconds: float) -> int:
+        promoted = int((now - self.enqueued) / aging_seconds) if aging_seconds > 0 else 0
+        return max(0, PRIORITIES[self.priority] - promoted)
+
+
+class TenantState:
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.running = 0
+        self.started = 0
+        # Virtual finish time of this tenant's last queued call (start-time fair queueing)
+        self.last_tag = 0.0
+
+
+class CallScheduler:
+    # Admission control for model calls: priority classes, weighted fair share
+    # between tenants, per-tenant quotas and aging so batch work is not starved
+
+    def __init__(self, config: SchedulerConfig = None):
+        self.config = config or SchedulerConfig.from_env()
+        self.tenants: Dict[str, TenantState] = {}
+        self.queue: List[Waiter] = []
+        self.running = 0
+        self.virtual_time = 0.0
+        self.promoted = 0
+        self._seq = itertools.count()
+        self.waits: Dict[str, Deque[float]] = {p: deque(maxlen=200) for p in PRIORITIES}
+
+    def _tenant(self, name: str) -> TenantState:
+        if name not in self.tenants:
+            self.tenants[name] = TenantState(self.config.tenant_weights.get(name, 1.0))
+        return self.tenants[name]
+
+    def _pick(self) -> Optional[Waiter]:
+        now = time.monotonic()
+        best, best_key = None, None
+        for waiter in self.queue:
+            if self.tenants[waiter.tenant].running >= self.config.tenant_quota:
+                continue
+            key = (waiter.effective_priority(now, self.config.aging_seconds), waiter.tag, waiter.seq)
+            if best_key is None or key < best_key:
+                best, best_key = waiter, key
+        return best
+
+    def _dispatch(self):
+        while self.running < self.config.max_concurrent:
+            waiter = self._pick()
+            if waiter is None:
+                return
+            self.queue.remove(waiter)
+            if waiter.future.done():
+                continue
+            if waiter.effective_priority(time.monotonic(), self.config.aging_seconds) < PRIORITIES[waiter.priority]:
+                self.promoted += 1
+            self._start(waiter.tenant)
+            self.virtual_time = max(self.virtual_time, waiter.tag)
+            waiter.future.set_result(None)
+
+    def _start(self, tenant: str):
+        state = self._tenant(tenant)
+        state.running += 1
+        state.started += 1
+        self.running += 1
+
+    def _release(self, tenant: str):
+        self.tenants[tenant].running -= 1
+        self.running -= 1
+        self._dispatch()
+        self._prune(tenant)
+
+    def _prune(self, tenant: str):
+        # Idle tenants are forgotten; once all their calls have been dispatched the
+        # virtual clock is past their last tag, so a fresh state loses nothing
+        state = self.tenants.get(tenant)
+        if state and state.running == 0 and not any(w.tenant == tenant for w in self.queue):
+            del self.tenants[tenant]
+
+    @asynccontextmanager
+    async def slot(self, tenant: str = None, priority: str = None):
+        # Defaults to the caller's call_context()
+        context_tenant, context_priority = CALL_CONTEXT.get()
+        tenant = tenant or context_tenant
+        priority = priority or context_priority
+        state = self._tenant(tenant)
+
+        # Each call advances its tenant's virtual clock by 1/weight, so heavier
+        # tenants get proportionally more of the contended slots
+        tag = max(self.virtual_time, state.last_tag) + 1.0 / state.weight
+        state.last_tag = tag
+        waiter = Waiter(tenant, priority, tag, next(self._seq))
+        self.queue.append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self.queue:
+                self.queue.remove(waiter)
+                self._prune(tenant)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # Granted a slot in the same tick we were cancelled; hand it on
+                self._release(tenant)
+            raise
+        self.waits[priority].append(time.monotonic() - waiter.enqueued)
+
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+
+        def p95(values) -> Optional[float]:
+            if not values:
+                return None
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3)
+
+        return {
+            "running": self.running,
+            "max_concurrent": self.config.max_concurrent,
+            "tenant_quota": self.config.tenant_quota,
+            "aging_seconds": self.config.aging_seconds,
+            "promoted_by_aging": self.promoted,
+            "queued": {p: sum(1 for w in self.queue if w.priority == p) for p in PRIORITIES},
+            "oldest_wait_seconds": round(max((now - w.enqueued for w in self.queue), default=0.0), 3),
+            "p95_wait_seconds": {p: p95(waits) for p, waits in self.waits.items()},
+            "tenants": {
+                name: {
+                    "weight": state.weight,
+                    "running": state.running,
+                    "queued": sum(1 for w in self.queue if w.tenant == name),
+                    "started": state.started
+                }
+                for name, state in self.tenants.items()
+            }
+        }
+
+
+SCHEDULER = CallScheduler()
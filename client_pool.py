@@ -0,0 +1,132 @@
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+
+@dataclass
+class PoolConfig:
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 120.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 90.0
+    # Hard cap on one model call, enforced by AIAPI around the request
+    total_timeout: float = 120.0
+    max_retries: int = 2
+    # How long Ollama keeps the model loaded after a call
+    ollama_keep_alive: str = "30m"
+    ollama_host: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        defaults = cls()
+        return cls(
+            max_connections=int(os.environ.get("BACKEND_MAX_CONNECTIONS", defaults.max_connections)),
+            max_keepalive_connections=int(os.environ.get("BACKEND_MAX_KEEPALIVE", defaults.max_keepalive_connections)),
+            keepalive_expiry=float(os.environ.get("BACKEND_KEEPALIVE_EXPIRY", defaults.keepalive_expiry)),
+            connect_timeout=float(os.environ.get("BACKEND_CONNECT_TIMEOUT", defaults.connect_timeout)),
+            read_timeout=float(os.environ.get("BACKEND_READ_TIMEOUT", defaults.read_timeout)),
+            total_timeout=float(os.environ.get("BACKEND_TOTAL_TIMEOUT", defaults.total_timeout)),
+            max_retries=int(os.environ.get("BACKEND_MAX_RETRIES", defaults.max_retries)),
+            ollama_keep_alive=os.environ.get("OLLAMA_KEEP_ALIVE", defaults.ollama_keep_alive),
+            ollama_host=os.environ.get("OLLAMA_HOST") or None
+        )
+
+
+class CountingTransport(httpx.AsyncHTTPTransport):
+    # Counts requests vs. newly opened connections to show keep-alive reuse
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+        self.connections_opened = 0
+        self._seen = weakref.WeakSet()
+
+    async def handle_async_request(self, request):
+        response = await super().handle_async_request(request)
+        self.requests += 1
+        for connection in self._pool.connections:
+            if connection not in self._seen:
+                self._seen.add(connection)
+                self.connections_opened += 1
+        return response
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "open_connections": len(self._pool.connections),
+            "reuse_ratio": round(1 - self.connections_opened / self.requests, 3) if self.requests else None
+        }
+
+
+class ClientPool:
+    # Process-wide backend clients, shared by every analyzer, agent and session
+
+    def __init__(self, config: PoolConfig = None):
+        self.config = config or PoolConfig.from_env()
+        self._clients: Dict[tuple, object] = {}
+        self._transports: Dict[tuple, CountingTransport] = {}
+        self._lock = threading.Lock()
+
+    def _transport(self, key: tuple) -> CountingTransport:
+        transport = CountingTransport(
+            limits=httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive_connections,
+                keepalive_expiry=self.config.keepalive_expiry
+            )
+        )
+        self._transports[key] = transport
+        return transport
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.config.read_timeout, connect=self.config.connect_timeout)
+
+    def anthropic(self, api_key: str):
+        key = ("anthropic", api_key)
+        with self._lock:
+            if key not in self._clients:
+                import anthropic
+                self._clients[key] = anthropic.AsyncAnthropic(
+                    api_key=api_key,
+                    max_retries=self.config.max_retries,
+                    timeout=self._timeout(),
+                    http_client=httpx.AsyncClient(transport=self._transport(key), timeout=self._timeout())
+                )
+            return self._clients[key]
+
+    def ollama(self, host: str = None):
+        host = host or self.config.ollama_host
+        key = ("ollama", host)
+        with self._lock:
+            if key not in self._clients:
+                import ollama
+                # Extra kwargs are handed to ollama's underlying httpx.AsyncClient
+                self._clients[key] = ollama.AsyncClient(
+                    host=host,
+                    timeout=self._timeout(),
+                    transport=self._transport(key)
+                )
+            return self._clients[key]
+
+    def stats(self) -> Dict:
+        return {
+            f"{kind}:{name or 'default'}" if kind == "ollama" else kind: transport.stats()
+            for (kind, name), transport in self._transports.items()
+        }
+
+    async def close(self):
+        with self._lock:
+            transports = list(self._transports.values())
+            self._clients.clear()
+            self._transports.clear()
+        for transport in transports:
+            await transport.aclose()
+
+
+POOL = ClientPool()
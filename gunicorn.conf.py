@@ -0,0 +1,11 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py server:app
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Analyses are long-running; keep gunicorn from killing busy workers
+timeout = int(float(os.environ.get("ANALYZE_TIMEOUT", "120"))) + 30
+graceful_timeout = 30
+raw_env = ["SKIP_PROMPTS=1"]
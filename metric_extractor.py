@@ -0,0 +1,268 @@
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+# Unit normalisation for dollar amounts: "$2.8B", "$3.2 billion", "$450 million"
+UNIT_MULTIPLIERS = {
+    "trillion": 1e12, "t": 1e12,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+    "million": 1e6, "mm": 1e6, "mn": 1e6, "m": 1e6,
+    "thousand": 1e3, "k": 1e3,
+}
+
+# "-$50 million", "($45) million" and "$(45) million" are negative
+MONEY_RE = re.compile(
+    r'(?P<minus>-\s?|\(\s?)?\$\s?(?P<paren>\()?(?P<number>\d[\d,]*(?:\.\d+)?)\)?'
+    r'\s*(?P<unit>trillion|billion|million|thousand|bn|mm|mn|[tbmk])?\b',
+    re.IGNORECASE
+)
+# "was negative $50 million", "a loss of $30 million", "cash outflow of $20 million"
+NEGATIVE_RE = re.compile(
+    r'\b(?:negative|minus|loss(?:es)?(?:\s+of)?|outflows?(?:\s+of)?|deficit(?:\s+of)?|burn(?:\s+of)?)\s*$',
+    re.IGNORECASE
+)
+PERCENT_RE = re.compile(r'(-?\d+(?:\.\d+)?)\s?(?:%|percent\b|per cent\b)', re.IGNORECASE)
+CHANGE_RE = re.compile(
+    r'\b(up|down|increased|decreased|grew|growth of|declined|rose|fell|higher|lower)\b'
+    r'[^.$%]{0,25}?(\d+(?:\.\d+)?)\s?(?:%|percent\b)',
+    re.IGNORECASE
+)
+PRIOR_RE = re.compile(
+    r'\b(?:down|up|compared to|versus|vs\.?)\s+(?:from\s+)?(\d+(?:\.\d+)?)\s?(?:%|percent\b)',
+    re.IGNORECASE
+)
+YOY_RE = re.compile(r'year[- ]over[- ]year|\byoy\b|\by/y\b|from (?:a|the) year ago', re.IGNORECASE)
+
+# A figure belongs to the keyword's own sentence or speaker turn ("vs." and decimals don't end one)
+SENTENCE_END_RE = re.compile(r"(?<!\bvs)\.(?=\s|$)|;|\n\s*\n|\n\s*[A-Z][\w .'-]{0,40}:")
+
+# Keyword -> metric name; one alternation so the transcript is scanned once.
+# "revenue guidance" and "expect ... revenue" are guidance, "sales and marketing" is an expense.
+METRIC_PATTERNS = {
+    "guidance": (
+        r'(?:revenue|sales)\b[^.$]{0,30}?\b(?:guidance|outlook)'
+        r'|(?:guidance|guiding|guide|outlook|expect(?:s|ing)?)\b(?:[^.]{0,40}?\b(?:revenues?|sales)\b)?'
+    ),
+    "free_cash_flow": r'free cash flow|\bfcf\b',
+    "gross_margin": r'gross margins?',
+    "operating_margin": r'operating margins?|ebit margins?',
+    "net_income": r'net income|net profit|net earnings|net loss(?:es)?',
+    "arr": r'annual recurring revenue|\barr\b',
+    "revenue": r'(?:total |quarterly |net )?revenues?|(?:net |total )?sales\b(?!\s+(?:and|&)\s+marketing)',
+}
+METRIC_RE = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in METRIC_PATTERNS.items()),
+    re.IGNORECASE
+)
+
+PERCENT_METRICS = {"gross_margin", "operating_margin"}
+WINDOW = 120
+
+# Which extracted metrics pre-fill each agent's key_metrics
+AGENT_METRICS = {
+    "revenue": ["revenue", "guidance", "arr"],
+    "profitability": ["gross_margin", "operating_margin", "net_income", "free_cash_flow"],
+}
+
+
+def parse_money(number: str, unit: Optional[str]) -> float:
+    value = float(number.replace(",", ""))
+    return value * UNIT_MULTIPLIERS.get((unit or "").lower(), 1.0)
+
+
+def money_value(match: re.Match) -> float:
+    value = parse_money(match.group("number"), match.group("unit"))
+    return -value if match.group("minus") or match.group("paren") else value
+
+
+def format_money(value: float) -> str:
+    # Keeps every stated digit: $812.5M stays $812.5M, $1,234M becomes $1.234B
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    for suffix, scale in (("T", 1e12), ("B", 1e9), ("M", 1e6), ("K", 1e3)):
+        if value >= scale:
+            return f"{sign}${f'{value / scale:.6f}'.rstrip('0').rstrip('.')}{suffix}"
+    return f"{sign}${value:,.2f}".replace(".00", "")
+
+
+def format_percent(value: float) -> str:
+    return f"{value:g}%"
+
+
+def _extract_one(name: str, keyword: str, window: str) -> Optional[Dict]:
+    if name in PERCENT_METRICS:
+        match = PERCENT_RE.search(window)
+        if not match:
+            return None
+        fact = {"value": float(match.group(1)), "unit": "%"}
+        prior = PRIOR_RE.search(window, match.end())
+        if prior:
+            fact["prior"] = float(prior.group(1))
+        return fact
+
+    match = MONEY_RE.search(window)
+    if not match:
+        return None
+    value = money_value(match)
+    # "net loss ... $30M" and "negative $50M" are losses however the figure itself is written
+    if value > 0 and ("loss" in keyword.lower() or NEGATIVE_RE.search(window, 0, match.start())):
+        value = -value
+    fact = {"value": value, "unit": "USD"}
+
+    # "up 12% to $2.8B" as well as "$2.8B, up 12%"
+    change = CHANGE_RE.search(window, match.end()) or CHANGE_RE.search(window, 0, match.start())
+    if change:
+        pct = float(change.group(2))
+        direction = change.group(1).lower()
+        if direction in ("down", "decreased", "declined", "fell", "lower"):
+            pct = -pct
+        fact["change_pct"] = pct
+        fact["yoy"] = bool(YOY_RE.search(window, change.end(), change.end() + 40))
+    return fact
+
+
+def extract_metrics(text: str) -> Dict[str, Dict]:
+    if not text:
+        return {}
+
+    facts = {}
+    for match in METRIC_RE.finditer(text):
+        name = match.lastgroup
+        if name in facts:
+            continue
+        window = text[match.end():match.end() + WINDOW]
+        end = SENTENCE_END_RE.search(window)
+        fact = _extract_one(name, match.group(0), window[:end.start()] if end else window)
+        if fact:
+            facts[name] = fact
+        if len(facts) == len(METRIC_PATTERNS):
+            break
+
+    return facts
+
+
+def extract_metrics_batch(texts: List[str], workers: int = 1) -> List[Dict[str, Dict]]:
+    if workers <= 1 or len(texts) < workers:
+        return [extract_metrics(text) for text in texts]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(extract_metrics, texts, chunksize=max(1, len(texts) // (workers * 4))))
+
+
+def describe_fact(name: str, fact: Dict) -> str:
+    if fact["unit"] == "%":
+        text = format_percent(fact["value"])
+        if "prior" in fact:
+            direction = "down" if fact["value"] < fact["prior"] else "up"
+            text += f" ({direction} from {format_percent(fact['prior'])})"
+        return text
+
+    text = format_money(fact["value"])
+    if "change_pct" in fact:
+        direction = "up" if fact["change_pct"] >= 0 else "down"
+        text += f" ({direction} {format_percent(abs(fact['change_pct']))}{' YoY' if fact.get('yoy') else ''})"
+    return text
+
+
+def to_key_metrics(facts: Dict[str, Dict], agent: str = None) -> Dict[str, str]:
+    names = AGENT_METRICS.get(agent, list(facts)) if agent else list(facts)
+    return {name: describe_fact(name, facts[name]) for name in names if name in facts}
+
+
+def prompt_context(facts: Dict[str, Dict], agent: str) -> str:
+    key_metrics = to_key_metrics(facts, agent)
+    if not key_metrics:
+        return ""
+    lines = "\n".join(f"- {name}: {value}" for name, value in key_metrics.items())
+    return (
+        "\n\nPre-extracted figures (parsed directly from the transcript, treat as facts):\n"
+        f"{lines}\n"
+        "Use these figures in key_metrics and focus your reasoning on what they mean."
+    )
+
+
+def is_placeholder(value) -> bool:
+    # Blank metric, or a schema placeholder ("N/A", "revenue as string") echoed by the model
+    text = str(value).strip()
+    return not text or text.upper() in ("N/A", "NA", "UNKNOWN", "NONE") or " as string" in text
+
+
+def prefill_key_metrics(analysis: Dict, facts: Dict[str, Dict], agent: str) -> Dict:
+    # Fill metrics the model left blank or returned as a schema placeholder
+    key_metrics = analysis.get("key_metrics")
+    if not isinstance(key_metrics, dict):
+        key_metrics = {}
+    for name, value in to_key_metrics(facts, agent).items():
+        if is_placeholder(key_metrics.get(name, "")):
+            key_metrics[name] = value
+    analysis["key_metrics"] = key_metrics
+    return analysis
+
+
+def _numbers_in(text: str) -> List[float]:
+    values = [money_value(m) for m in MONEY_RE.finditer(text)]
+    values += [float(m.group(1)) for m in PERCENT_RE.finditer(text)]
+    return values
+
+
+async def benchmark(texts: List[str], ai_api, agents=("revenue", "profitability")) -> Dict:
+    # Compare the local extractor with the model's key_metrics on the same transcripts
+    from Earnings_Call_Analyzer import safe_json_parse
+
+    start = time.perf_counter()
+    local = extract_metrics_batch(texts)
+    local_seconds = time.perf_counter() - start
+
+    llm_seconds = 0.0
+    compared = agreed = 0
+    for text, facts in zip(texts, local):
+        for agent in agents:
+            prompt = (
+                f"Extract the {agent} key_metrics from this transcript as a flat JSON object "
+                f"with keys {AGENT_METRICS[agent]}.\n\nDocument text:\n{text}"
+            )
+            start = time.perf_counter()
+            response = await ai_api.analyze_document(
+                system_prompt="You extract financial figures from earnings calls.",
+                user_prompt=prompt,
+                max_tokens=300
+            )
+            llm_seconds += time.perf_counter() - start
+
+            parsed = safe_json_parse(response, agent, ai_api)
+            llm_metrics = parsed.get("key_metrics", parsed)
+            for name in AGENT_METRICS[agent]:
+                if name not in facts or name not in llm_metrics:
+                    continue
+                compared += 1
+                llm_values = _numbers_in(str(llm_metrics[name]))
+                if llm_values and abs(llm_values[0] - facts[name]["value"]) <= 0.01 * abs(facts[name]["value"]):
+                    agreed += 1
+
+    return {
+        "transcripts": len(texts),
+        "local_ms_per_transcript": round(1000 * local_seconds / max(len(texts), 1), 3),
+        "llm_ms_per_transcript": round(1000 * llm_seconds / max(len(texts), 1), 1),
+        "metrics_compared": compared,
+        "agreement": round(agreed / compared, 3) if compared else None
+    }
+
+
+if __name__ == "__main__":
+    import asyncio
+    import os
+
+    os.environ.setdefault("SKIP_PROMPTS", "1")
+    from Earnings_Call_Analyzer import AIAPI, ANTHROPIC_API_KEY, USE_OLLAMA
+
+    sample = """
+    CEO: I'm pleased to report revenue of $3.2 billion, up 18% year-over-year.
+    CFO: Gross margin came in at 68%, down from 71% last quarter. Operating margin
+    was 15%. Net income was $610 million. Free cash flow was strong at $450 million.
+    For Q4 we expect revenue of $3.4 billion.
+    """
+    print(extract_metrics(sample))
+    print(to_key_metrics(extract_metrics(sample)))
+    result = asyncio.run(benchmark([sample] * 3, AIAPI(api_key=ANTHROPIC_API_KEY, use_ollama=USE_OLLAMA)))
+    print(result)
@@ -0,0 +1,271 @@
+import hashlib
+import json
+from functools import lru_cache
+import random
+import re
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from sqlite_local import LocalConnection
+
+NUMPY_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    pass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_key TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    report TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (content_key, scope)
+);
+"""
+
+NUM_PERM = 128
+# 16 bands of 8 rows: a pair at Jaccard 0.85 shares a bucket ~99% of the time, at 0.5 ~6%
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+MERSENNE = (1 << 31) - 1
+FNV_PRIME = 0x100000001B3
+MASK64 = (1 << 64) - 1
+BULK_LOAD_ROWS = 1000
+
+# Fixed seed: signatures are persisted and must be comparable across processes and restarts
+_rng = random.Random(0x5EED)
+PERM_A = [_rng.randrange(1, MERSENNE) for _ in range(NUM_PERM)]
+PERM_B = [_rng.randrange(0, MERSENNE) for _ in range(NUM_PERM)]
+if NUMPY_AVAILABLE:
+    _A = np.array(PERM_A, dtype=np.uint64)[:, None]
+    _B = np.array(PERM_B, dtype=np.uint64)[:, None]
+
+# Vendor differences: "JOHN SMITH - CEO:", "Operator:", "[Analyst]" line prefixes, punctuation, case
+SPEAKER_RE = re.compile(r"^\s*(?:\[[^\]\n]{1,60}\]|[A-Z][\w.,' ()&-]{0,60}?:)\s*", re.MULTILINE)
+WORD_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def normalize(text: str) -> List[str]:
+    return WORD_RE.findall(SPEAKER_RE.sub(" ", text).lower())
+
+
+def shingles(text: str) -> List[int]:
+    words = normalize(text)
+    if len(words) < SHINGLE_WORDS:
+        words = words + [""] * (SHINGLE_WORDS - len(words))
+    return list({
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode())
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    })
+
+
+def signature(text: str) -> bytes:
+    # MinHash: per permutation (a*x + b) mod p, keep the minimum over all shingles
+    hashes = shingles(text)
+    if NUMPY_AVAILABLE:
+        # a < 2^31 and x < 2^32, so a*x + b fits in uint64
+        values = np.array(hashes, dtype=np.uint64)[None, :]
+        mins = ((_A * values + _B) % MERSENNE).min(axis=1)
+        return mins.astype(np.uint32).tobytes()
+    mins = array("I", (min((a * x + b) % MERSENNE for x in hashes) for a, b in zip(PERM_A, PERM_B)))
+    return mins.tobytes()
+
+
+def similarity(sig_a: bytes, sig_b: bytes) -> float:
+    # Fraction of agreeing MinHash values estimates the Jaccard similarity of the shingle sets
+    if NUMPY_AVAILABLE:
+        return float(np.count_nonzero(np.frombuffer(sig_a, np.uint32) == np.frombuffer(sig_b, np.uint32))) / NUM_PERM
+    a, b = array("I"), array("I")
+    a.frombytes(sig_a)
+    b.frombytes(sig_b)
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+@lru_cache(maxsize=64)
+def band_seeds(scope: str) -> Tuple[int, ...]:
+    # Per-band starting values; the scope keeps backends / prompt versions apart
+    return tuple(
+        int.from_bytes(hashlib.blake2b(f"{scope}\0{band}".encode(), digest_size=8).digest(), "little")
+        for band in range(BANDS)
+    )
+
+
+def band_keys(sig: bytes, scope: str) -> List[int]:
+    # One 64-bit bucket key per band: FNV-1a style fold of the band's MinHash values
+    values = array("I")
+    values.frombytes(sig)
+    keys = []
+    for band, seed in enumerate(band_seeds(scope)):
+        key = seed
+        for value in values[band * ROWS:(band + 1) * ROWS]:
+            key = ((key ^ value) * FNV_PRIME) & MASK64
+        keys.append(key)
+    return keys
+
+
+def band_keys_bulk(sigs: List[bytes], scope: str):
+    # band_keys for many signatures at once; uint64 arithmetic wraps like the & MASK64 above
+    values = np.frombuffer(b"".join(sigs), dtype=np.uint32).reshape(-1, BANDS, ROWS).astype(np.uint64)
+    keys = np.repeat(np.array(band_seeds(scope), dtype=np.uint64)[None, :], len(sigs), axis=0)
+    prime = np.uint64(FNV_PRIME)
+    for row in range(ROWS):
+        keys = (keys ^ values[:, :, row]) * prime
+    return keys
+
+
+class NearDuplicateIndex:
+    # MinHash / LSH index over analysed transcripts, in memory with a SQLite (WAL) copy on disk.
+    # Bucket keys live in a sorted array (numpy) plus a small dict of recent inserts,
+    # so a lookup is BANDS binary searches regardless of index size.
+
+    MERGE_EVERY = 20000
+
+    def __init__(self, path: str = "near_duplicates.db", threshold: float = 0.85):
+        self.path = path
+        self.threshold = threshold
+        self._connect = LocalConnection(path, autocommit=True)
+        self._lock = threading.Lock()
+        self.signatures: Dict[int, bytes] = {}
+        self.recent: Dict[int, List[int]] = {}
+        self.recent_entries = 0
+        self.last_id = 0
+        self.lookups = 0
+        self.hits = 0
+        if NUMPY_AVAILABLE:
+            self.keys = np.empty(0, dtype=np.uint64)
+            self.ids = np.empty(0, dtype=np.int64)
+        self._connect().executescript(SCHEMA)
+        self.sync()
+        self._merge()
+
+    def _insert(self, doc_id: int, scope: str, sig: bytes):
+        self.signatures[doc_id] = sig
+        for key in band_keys(sig, scope):
+            self.recent.setdefault(key, []).append(doc_id)
+        self.recent_entries += BANDS
+
+    def _merge(self):
+        # Fold recent inserts into the sorted arrays
+        if not NUMPY_AVAILABLE or not self.recent:
+            return
+        new_keys = np.fromiter((k for k, ids in self.recent.items() for _ in ids), dtype=np.uint64)
+        new_ids = np.fromiter((i for ids in self.recent.values() for i in ids), dtype=np.int64)
+        keys = np.concatenate([self.keys, new_keys])
+        ids = np.concatenate([self.ids, new_ids])
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.ids = keys[order], ids[order]
+        self.recent.clear()
+        self.recent_entries = 0
+
+    def _bulk_insert(self, rows: List[Tuple[int, str, bytes]]):
+        # Startup load: hash all bands in one pass and merge straight into the sorted arrays
+        by_scope: Dict[str, List[Tuple[int, bytes]]] = {}
+        for doc_id, scope, sig in rows:
+            if doc_id not in self.signatures:
+                self.signatures[doc_id] = sig
+                by_scope.setdefault(scope, []).append((doc_id, sig))
+        keys, ids = [self.keys], [self.ids]
+        for scope, docs in by_scope.items():
+            keys.append(band_keys_bulk([sig for _, sig in docs], scope).ravel())
+            ids.append(np.repeat(np.array([doc_id for doc_id, _ in docs], dtype=np.int64), BANDS))
+        keys, ids = np.concatenate(keys), np.concatenate(ids)
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.ids = keys[order], ids[order]
+
+    def sync(self) -> int:
+        # Picks up transcripts added by other worker processes
+        rows = self._connect().execute(
+            "SELECT id, scope, signature FROM transcripts WHERE id > ? ORDER BY id", (self.last_id,)
+        ).fetchall()
+        with self._lock:
+            if NUMPY_AVAILABLE and len(rows) >= BULK_LOAD_ROWS:
+                self._bulk_insert(rows)
+            else:
+                for doc_id, scope, sig in rows:
+                    if doc_id not in self.signatures:
+                        self._insert(doc_id, scope, bytes(sig))
+            if rows:
+                self.last_id = rows[-1][0]
+            if self.recent_entries >= self.MERGE_EVERY:
+                self._merge()
+        return len(rows)
+
+    def candidates(self, sig: bytes, scope: str) -> List[int]:
+        keys = band_keys(sig, scope)
+        found = set()
+        # Lookups and inserts run on executor threads; _merge swaps the arrays and clears recent
+        with self._lock:
+            for key in keys:
+                found.update(self.recent.get(key, ()))
+            if NUMPY_AVAILABLE and len(self.keys):
+                query = np.array(keys, dtype=np.uint64)
+                lo = np.searchsorted(self.keys, query, side="left")
+                hi = np.searchsorted(self.keys, query, side="right")
+                for start, end in zip(lo.tolist(), hi.tolist()):
+                    if end > start:
+                        found.update(self.ids[start:end].tolist())
+        return list(found)
+
+    def match(self, sig: bytes, scope: str) -> Optional[Tuple[int, float]]:
+        self.sync()
+        best = None
+        for doc_id in self.candidates(sig, scope):
+            score = similarity(sig, self.signatures[doc_id])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (doc_id, score)
+        return best
+
+    def lookup(self, text: str, scope: str, sig: bytes = None) -> Optional[Dict]:
+        # Returns the stored report of the most similar transcript above the threshold;
+        # pass sig when the caller already has the transcript's signature
+        started = time.perf_counter()
+        self.lookups += 1
+        best = self.match(sig or signature(text), scope)
+        if best is None:
+            return None
+        doc_id, score = best
+        row = self._connect().execute(
+            "SELECT content_key, report FROM transcripts WHERE id = ?", (doc_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        report = json.loads(row[1])
+        report["near_duplicate"] = {
+            "source_key": row[0],
+            "similarity": round(score, 3),
+            "lookup_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+        return report
+
+    def add(self, text: str, scope: str, content_key: str, report: Dict, sig: bytes = None) -> Optional[int]:
+        sig = sig or signature(text)
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO transcripts (content_key, scope, signature, report, created_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (content_key, scope, sig, json.dumps(report), time.time())
+        )
+        if not cursor.rowcount:
+            return None
+        with self._lock:
+            self._insert(cursor.lastrowid, scope, sig)
+            if self.recent_entries >= self.MERGE_EVERY:
+                self._merge()
+        return cursor.lastrowid
+
+    def stats(self) -> Dict:
+        return {
+            "transcripts": len(self.signatures),
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "numpy": NUMPY_AVAILABLE
+        }
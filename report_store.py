@@ -0,0 +1,232 @@
+import json
+import re
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlite_local import LocalConnection
+
+PERIOD_RE = re.compile(
+    r'\b(?:(Q[1-4])|(?:fiscal\s+)?(first|second|third|fourth)\s+quarter)'
+    r'(?:\s+of)?\s*(?:fiscal\s+(?:year\s+)?|fy\s*)?\'?((?:19|20)?\d{2})\b',
+    re.IGNORECASE
+)
+QUARTER_WORDS = {"first": "Q1", "second": "Q2", "third": "Q3", "fourth": "Q4"}
+COMPANY_RE = re.compile(
+    r'([A-Z][\w&.\'-]*(?:\s+[A-Z][\w&.\'-]*){0,4}\s+(?:Inc|Corp|Corporation|Ltd|PLC|plc|Co|Company|Group|Holdings|AG|SA|NV)\b)'
+)
+# Legal forms dropped from the lookup key, so "TechCorp Inc." and "TechCorp" are one company
+LEGAL_SUFFIX_RE = re.compile(
+    r'(?:\s+(?:inc|incorporated|corp|corporation|co|ltd|limited|plc|llc|lp|ag|sa|nv|se|gmbh))+$'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company TEXT NOT NULL,
+    company_key TEXT NOT NULL,
+    fiscal_period TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    overall_score REAL,
+    verdict TEXT,
+    created_at TEXT NOT NULL,
+    report TEXT NOT NULL
+);
+DROP INDEX IF EXISTS idx_reports_company;
+CREATE INDEX IF NOT EXISTS idx_reports_company_trend
+    ON reports (company_key, fiscal_period, backend, prompt_version, overall_score, verdict);
+CREATE INDEX IF NOT EXISTS idx_reports_period_score ON reports (fiscal_period, overall_score);
+CREATE INDEX IF NOT EXISTS idx_reports_backend ON reports (backend, prompt_version);
+"""
+
+
+def normalize_period(period: str) -> Optional[str]:
+    # "Q3 2025", "third quarter of fiscal 2025", "2025Q3" -> "2025-Q3" (sorts chronologically)
+    if not period:
+        return None
+    compact = re.match(r'^\s*((?:19|20)\d{2})\s*-?\s*(Q[1-4])\s*$', period, re.IGNORECASE)
+    if compact:
+        return f"{compact.group(1)}-{compact.group(2).upper()}"
+    match = PERIOD_RE.search(period)
+    if not match:
+        return period.strip()
+    quarter = (match.group(1) or QUARTER_WORDS[match.group(2).lower()]).upper()
+    year = match.group(3)
+    if len(year) == 2:
+        year = "20" + year
+    return f"{year}-{quarter}"
+
+
+def guess_period(text: str) -> Optional[str]:
+    match = PERIOD_RE.search(text[:5000]) if text else None
+    return normalize_period(match.group(0)) if match else None
+
+
+def guess_company(text: str) -> Optional[str]:
+    match = COMPANY_RE.search(text[:5000]) if text else None
+    return match.group(1).strip() if match else None
+
+
+def company_key(company: str) -> str:
+    # Lowercase, punctuation to spaces ("Procter & Gamble Co." -> "procter gamble")
+    key = re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', company.lower())).strip()
+    return LEGAL_SUFFIX_RE.sub('', key) or key
+
+
+class ReportStore:
+
+    def __init__(self, path: str = "reports.db"):
+        self.path = path
+        self._connect = LocalConnection(path, row_factory=sqlite3.Row)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+
+    def _migrate(self, conn: sqlite3.Connection):
+        # user_version 1: company_key strips punctuation and legal suffixes
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+        with conn:
+            rows = conn.execute("SELECT id, company, company_key FROM reports").fetchall()
+            conn.executemany(
+                "UPDATE reports SET company_key = ? WHERE id = ?",
+                [(company_key(row["company"]), row["id"]) for row in rows
+                 if company_key(row["company"]) != row["company_key"]]
+            )
+            conn.execute("PRAGMA user_version = 1")
+
+
+    def save(
+        self,
+        report: Dict,
+        company: str,
+        fiscal_period: str,
+        backend: str,
+        prompt_version: str
+    ) -> int:
+        consensus = report.get("consensus", {})
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO reports (company, company_key, fiscal_period, backend, prompt_version,"
+                " overall_score, verdict, created_at, report) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    company,
+                    company_key(company),
+                    normalize_period(fiscal_period) or "unknown",
+                    backend,
+                    prompt_version,
+                    consensus.get("overall_score"),
+                    consensus.get("verdict"),
+                    report.get("timestamp") or datetime.now().isoformat(),
+                    json.dumps(report)
+                )
+            )
+        return cursor.lastrowid
+
+    def get(self, report_id: int) -> Optional[Dict]:
+        row = self._connect().execute("SELECT report FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return json.loads(row["report"]) if row else None
+
+    def trend(
+        self,
+        company: str,
+        backend: str = None,
+        prompt_version: str = None,
+        limit: int = 40
+    ) -> List[Dict]:
+        # Latest report per fiscal period, newest periods first; covered by idx_reports_company_trend.
+        # Periods that could not be normalised ("unknown", free text) don't sort in time, so are left out
+        query = (
+            "SELECT fiscal_period, overall_score, verdict, backend, prompt_version, MAX(id) AS id"
+            " FROM reports WHERE company_key = ? AND fiscal_period GLOB '[12][0-9][0-9][0-9]-Q[1-4]'"
+        )
+        params: list = [company_key(company)]
+        if backend:
+            query += " AND backend = ?"
+            params.append(backend)
+        if prompt_version:
+            query += " AND prompt_version = ?"
+            params.append(prompt_version)
+        query += " GROUP BY fiscal_period ORDER BY fiscal_period DESC LIMIT ?"
+        params.append(limit)
+
+        rows = self._connect().execute(query, params).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def ranked(
+        self,
+        fiscal_period: str,
+        n: int = 10,
+        bottom: bool = False,
+        backend: str = None,
+        prompt_version: str = None
+    ) -> List[Dict]:
+        query = (
+            "SELECT id, company, fiscal_period, overall_score, verdict, backend, prompt_version"
+            " FROM reports INDEXED BY idx_reports_period_score"
+            " WHERE fiscal_period = ? AND overall_score IS NOT NULL"
+        )
+        params: list = [normalize_period(fiscal_period)]
+        if backend:
+            query += " AND backend = ?"
+            params.append(backend)
+        if prompt_version:
+            query += " AND prompt_version = ?"
+            params.append(prompt_version)
+        query += f" ORDER BY overall_score {'ASC' if bottom else 'DESC'} LIMIT ?"
+        params.append(n)
+
+        return [dict(row) for row in self._connect().execute(query, params).fetchall()]
+
+    def agent_scores(
+        self,
+        report_keys: List[str],
+        fiscal_period: str = None,
+        backend: str = None,
+        prompt_version: str = None
+    ) -> List[sqlite3.Row]:
+        # Just the fields consensus needs, pulled out of the stored JSON by SQLite
+        columns = []
+        for key in report_keys:
+            if not re.match(r'^\w+$', key):
+                raise ValueError(f"Invalid report key '{key}'")
+            columns.append(f"json_extract(report, '$.detailed_analysis.{key}.score') AS \"{key}\"")
+        query = (
+            "SELECT id, company, fiscal_period, overall_score, verdict,"
+            " json_extract(report, '$.consensus.confidence') AS confidence,"
+            " json_extract(report, '$.detailed_analysis.management.tone_analysis.defensiveness_score') AS defensiveness,"
+            " json_extract(report, '$.detailed_analysis.management.tone_analysis.qa_deflections') AS deflections"
+            + "".join(", " + c for c in columns) +
+            " FROM reports WHERE 1 = 1"
+        )
+        params: list = []
+        if fiscal_period:
+            query += " AND fiscal_period = ?"
+            params.append(normalize_period(fiscal_period))
+        if backend:
+            query += " AND backend = ?"
+            params.append(backend)
+        if prompt_version:
+            query += " AND prompt_version = ?"
+            params.append(prompt_version)
+        return self._connect().execute(query, params).fetchall()
+
+    def update_consensus(self, rows: List[tuple]) -> int:
+        # rows: (overall_score, verdict, recommendation, red_flags json, id); no model calls involved
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE reports SET overall_score = ?1, verdict = ?2, report = json_set(report,"
+                " '$.consensus.overall_score', ?1, '$.consensus.verdict', ?2,"
+                " '$.consensus.recommendation', ?3, '$.consensus.red_flags', json(?4)) WHERE id = ?5",
+                rows
+            )
+        return len(rows)
+
+    def last_id(self) -> int:
+        return self._connect().execute("SELECT COALESCE(MAX(id), 0) FROM reports").fetchone()[0]
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM reports").fetchone()[0]
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples")
+INDEX_FILE = "index.json"
+
+
+def normalize_sample(raw: Dict) -> Dict:
+    # Bare agent analyses get the same consensus wrapper the API has always served
+    if "consensus" in raw:
+        return raw
+    return {
+        "company": raw.get("company", "Unknown Sample"),
+        "consensus": {
+            "overall_score": raw.get("revenue", {}).get("score", 0),
+            "verdict": "STRONG (Sample)",
+            "confidence": "High",
+            "recommendation": "This is a pre-loaded sample.",
+            "red_flags": ["None detected"]
+        },
+        "detailed_analysis": raw
+    }
+
+
+def serialize(data) -> Tuple[bytes, str]:
+    body = json.dumps(data, separators=(",", ":")).encode()
+    return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def build_index(directory: str = DEFAULT_SAMPLE_DIR) -> List[Dict]:
+    # Rewrites every payload in served form and regenerates index.json
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json") or name == INDEX_FILE:
+            continue
+        path = os.path.join(directory, name)
+        with open(path, "rb") as f:
+            sample = normalize_sample(json.load(f))
+        body, etag = serialize(sample)
+        with open(path, "wb") as f:
+            f.write(body)
+        entries.append({
+            "key": name[:-len(".json")],
+            "company": sample.get("company", "Unknown Sample"),
+            "overall_score": sample["consensus"].get("overall_score", 0),
+            "file": name,
+            "etag": etag,
+            "size": len(body)
+        })
+
+    with open(os.path.join(directory, INDEX_FILE), "w") as f:
+        json.dump({"samples": entries}, f, indent=1)
+    return entries
+
+
+class SampleCatalog:
+
+    def __init__(self, directory: str = DEFAULT_SAMPLE_DIR, cache_size: int = 32):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        # Sync endpoints call get_bytes from FastAPI's threadpool
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                entries = json.load(f)["samples"]
+        elif os.path.isdir(self.directory):
+            entries = build_index(self.directory)
+        else:
+            entries = []
+
+        self.index: Dict[str, Dict] = {entry["key"]: entry for entry in entries}
+        with self._lock:
+            self._cache.clear()
+
+        # The listing never changes at runtime, so serialise it once
+        self.listing_bytes, self.listing_etag = serialize({
+            "count": len(entries),
+            "samples": [
+                {"key": e["key"], "company": e["company"], "overall_score": e["overall_score"]}
+                for e in entries
+            ]
+        })
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def etag(self, key: str) -> Optional[str]:
+        entry = self.index.get(key)
+        return entry["etag"] if entry else None
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                return body
+
+        # Read outside the lock; two threads missing on one key just both read it
+        with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+            body = f.read()
+        with self._lock:
+            self._cache[key] = body
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return body
+
+    def preload(self, limit: int = None) -> int:
+        # Pull the first payloads into the cache so early requests skip the disk
+        keys = list(self.index)[:min(limit or self.cache_size, self.cache_size)]
+        for key in keys:
+            self.get_bytes(key)
+        return len(keys)
+
+    def __getitem__(self, key: str) -> Dict:
+        body = self.get_bytes(key)
+        if body is None:
+            raise KeyError(key)
+        return json.loads(body)
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        for key in self.index:
+            yield key, self[key]
+
+
+if __name__ == "__main__":
+    entries = build_index()
+    print(f"Indexed {len(entries)} samples in {DEFAULT_SAMPLE_DIR}")
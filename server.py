@@ -1,14 +1,63 @@
 import asyncio
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Dict, Optional
+import time
 import os
 
 os.environ.setdefault("SKIP_PROMPTS", "1")
 
-from Earnings_Call_Analyzer import EarningsAnalyzer
+from Earnings_Call_Analyzer import AGENT_REGISTRY, EarningsAnalyzer, PROMPT_VERSION
+from bulk_consensus import ScoreMatrix
+from report_store import ReportStore, guess_company, guess_period
+from shared_state import SharedState
+from near_duplicate import NearDuplicateIndex
+from client_pool import POOL
+from call_scheduler import SCHEDULER, PRIORITIES, call_context, tenant_id
+from warmup import warm_up, replay_paths
 
-app = FastAPI()
+# Set once startup warm-up (model load, patterns, samples, replay) has finished;
+# created in lifespan so it belongs to the server's event loop
+warmup_done: Optional[asyncio.Event] = None
+warmup_status = {"state": "pending"}
+
+def is_ready() -> bool:
+    return warmup_done is not None and warmup_done.is_set()
+
+async def run_warmup():
+    print("Warming up...")
+    started = asyncio.get_running_loop().time()
+    try:
+        warmup_status.update(await warm_up(
+            analyzer,
+            replay=replay_paths(os.environ.get("WARMUP_REPLAY", "")),
+            replay_limit=int(os.environ.get("WARMUP_REPLAY_LIMIT", "20"))
+        ))
+    finally:
+        warmup_status["state"] = "done"
+        warmup_status["seconds"] = round(asyncio.get_running_loop().time() - started, 2)
+        warmup_done.set()
+        print(f"Warm-up finished in {warmup_status['seconds']}s - ready")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global warmup_done
+    warmup_done = asyncio.Event()
+    if os.environ.get("WARMUP", "1") == "0":
+        warmup_status["state"] = "skipped"
+        warmup_done.set()
+        task = None
+    else:
+        # In the background so /api/health answers (not ready) while the model loads
+        task = asyncio.ensure_future(run_warmup())
+    yield
+    if task and not task.done():
+        task.cancel()
+    await POOL.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,10 +67,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-analyzer = EarningsAnalyzer()
+# Upper bound on a single analysis; clients may ask for less via timeout_seconds
+ANALYZE_TIMEOUT = float(os.environ.get("ANALYZE_TIMEOUT", "120"))
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Every worker process opens the same SQLite files, so caches and counters are shared
+shared = SharedState(
+    os.environ.get("SHARED_STATE_DB", "shared_state.db"),
+    stale_after=ANALYZE_TIMEOUT + 30
+)
+near_duplicates = None
+if os.environ.get("NEAR_DUP", "1") != "0":
+    near_duplicates = NearDuplicateIndex(
+        os.environ.get("NEAR_DUP_DB", "near_duplicates.db"),
+        threshold=float(os.environ.get("NEAR_DUP_THRESHOLD", "0.85"))
+    )
+analyzer = EarningsAnalyzer(
+    shared_state=shared,
+    cache_ttl=float(os.environ.get("RESULT_CACHE_TTL", "3600")),
+    near_duplicates=near_duplicates
+)
+store = ReportStore(os.environ.get("REPORT_DB", "reports.db"))
 
 class AnalysisRequest(BaseModel):
     text: str
+    company: Optional[str] = None
+    fiscal_period: Optional[str] = None
+    timeout_seconds: Optional[float] = None
+    # "interactive" (default) or "batch"; batch calls yield model slots to interactive ones
+    priority: Optional[str] = None
+
+class RescoreRequest(BaseModel):
+    # Omit fiscal_period to re-score the whole stored history
+    fiscal_period: Optional[str] = None
+    # Alternative weight sets by name, keyed by report section (revenue, profitability, management)
+    weight_sets: Optional[Dict[str, Dict[str, float]]] = None
+    n: int = 10
+    order: str = "top"
+    backend: Optional[str] = None
+    prompt_version: Optional[str] = None
+    # Name of a weight set ("default" or one of weight_sets) to write back into the stored reports
+    apply: Optional[str] = None
+
+# Score matrices by (period, backend, prompt version), reused until a new report is stored
+score_matrices: Dict[tuple, tuple] = {}
+
+def load_score_matrix(columns, fiscal_period, backend, prompt_version) -> ScoreMatrix:
+    key = (tuple(columns), fiscal_period, backend, prompt_version)
+    last_id = store.last_id()
+    cached = score_matrices.get(key)
+    if cached and cached[0] == last_id:
+        return cached[1]
+    matrix = ScoreMatrix(columns, store.agent_scores(
+        list(columns), fiscal_period, backend=backend, prompt_version=prompt_version
+    ))
+    score_matrices[key] = (last_id, matrix)
+    return matrix
+
+class ClientDisconnected(Exception):
+    pass
+
+async def run_while_connected(http_request: Request, coro, timeout: float):
+    # Cancels the analysis (and its model calls) if the client goes away or time runs out
+    task = asyncio.ensure_future(coro)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=min(DISCONNECT_POLL_SECONDS, max(0.0, deadline - loop.time())))
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise ClientDisconnected()
+            if loop.time() >= deadline:
+                raise asyncio.TimeoutError()
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
 
 @app.get("/")
 def read_root():
@@ -31,72 +154,219 @@ def read_root():
 def health_check():
     return {
         "status": "healthy",
+        "ready": is_ready(),
         "components": {
             "ai_engine": "active",
             "backend": "online"
+        },
+        "warmup": warmup_status
+    }
+
+@app.get("/api/ready")
+def readiness_check():
+    # For load balancers: only route traffic here once warm-up has completed
+    if not is_ready():
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"ready": True, "warmup": warmup_status}
+
+@app.get("/api/metrics")
+def get_metrics():
+    return {
+        "worker_pid": os.getpid(),
+        "shared": shared.metrics(),
+        "local": {
+            "single_flight": analyzer.single_flight.stats(),
+            "message_bus": analyzer.message_bus_stats(),
+            "backend_connections": POOL.stats(),
+            "call_scheduler": SCHEDULER.stats(),
+            "near_duplicates": near_duplicates.stats() if near_duplicates else None,
+            "token_budget": analyzer.ai_api.planner.stats(),
+            "model_cascade": analyzer.ai_api.cascade.stats()
         }
     }
 
 @app.get("/api/samples")
-def get_samples():
-    samples_list = []
-    if hasattr(analyzer, 'samples'):
-        for key, data in analyzer.samples.items():
-            score = 0
-            if "consensus" in data:
-                score = data["consensus"].get("overall_score", 0)
-            elif "revenue" in data: 
-                 score = data["revenue"].get("score", 0)
-                 
-            samples_list.append({
-                "key": key,
-                "company": data.get("company", "Unknown Sample"),
-                "overall_score": score
-            })
-    return {"count": len(samples_list), "samples": samples_list}
+def get_samples(request: Request):
+    catalog = analyzer.samples
+    if request.headers.get("if-none-match") == catalog.listing_etag:
+        return Response(status_code=304, headers={"ETag": catalog.listing_etag})
+    return Response(
+        content=catalog.listing_bytes,
+        media_type="application/json",
+        headers={"ETag": catalog.listing_etag}
+    )
 
 @app.get("/api/sample/{sample_key}")
-async def get_sample_detail(sample_key: str):
-    if not hasattr(analyzer, 'samples') or sample_key not in analyzer.samples:
+def get_sample_detail(sample_key: str, request: Request):
+    catalog = analyzer.samples
+    etag = catalog.etag(sample_key)
+    if etag is None:
         raise HTTPException(status_code=404, detail="Sample not found")
-    
-    raw_data = analyzer.samples[sample_key]
-
-    if "consensus" not in raw_data:
-        return {
-            "company": raw_data.get("company", "Unknown Sample"),
-            
-            "consensus": {
-                "overall_score": raw_data.get("revenue", {}).get("score", 0), 
-                "verdict": "STRONG (Sample)",
-                "confidence": "High", 
-                "recommendation": "This is a pre-loaded sample.",
-                "red_flags": ["None detected"]
-            },
-            
-            "detailed_analysis": raw_data
-        }
-            
-    return raw_data
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(
+        content=catalog.get_bytes(sample_key),
+        media_type="application/json",
+        headers={"ETag": etag}
+    )
 
 @app.post("/api/analyze")
-async def analyze_earnings(request: AnalysisRequest):
+async def analyze_earnings(request: AnalysisRequest, http_request: Request):
     print(f"Received analysis request: {len(request.text)} chars")
     
     if len(request.text) < 10:
         raise HTTPException(status_code=400, detail="Text too short (min 10 chars)")
 
+    priority = request.priority or "interactive"
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {sorted(PRIORITIES)}")
+    # Fair share and quotas are per tenant: X-Tenant if it names a configured tenant,
+    # else the API key, else the client address
+    tenant = tenant_id(
+        api_key=http_request.headers.get("x-api-key"),
+        tenant=http_request.headers.get("x-tenant"),
+        fallback=http_request.client.host if http_request.client else "default",
+        known=SCHEDULER.config.tenant_weights
+    )
+
+    timeout = min(request.timeout_seconds or ANALYZE_TIMEOUT, ANALYZE_TIMEOUT)
+    deadline = asyncio.get_running_loop().time() + timeout
+
+    # Requests that arrive before warm-up finishes wait for it rather than paying the cold start
+    if warmup_done is not None:
+        try:
+            await asyncio.wait_for(warmup_done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Server is still warming up")
+
     try:
-        report = await analyzer.analyze_document(text_content=request.text)
-        return report
+        # A small grace period lets the analyzer return partial results at the deadline
+        with call_context(tenant, priority):
+            report = await run_while_connected(
+                http_request,
+                analyzer.analyze_document(text_content=request.text, deadline=deadline),
+                timeout + 1.0
+            )
+    except ClientDisconnected:
+        print("Client disconnected - analysis cancelled")
+        return Response(status_code=499)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Analysis exceeded {timeout:.0f}s deadline")
     except Exception as e:
         print(f"Analysis Error: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-if __name__ == "__main__":
+    # Partial reports are returned but not kept in history; shared-cache hits and
+    # near-duplicate reuses were saved when first analysed and would duplicate that row
+    if report.get("partial") or report.get("cached") or report.get("near_duplicate"):
+        return report
+
+    try:
+        report_id = await asyncio.get_running_loop().run_in_executor(
+            None,
+            store.save,
+            report,
+            request.company or guess_company(request.text) or "Unknown",
+            request.fiscal_period or guess_period(request.text) or "unknown",
+            analyzer.ai_api.backend,
+            PROMPT_VERSION
+        )
+        report = {**report, "report_id": report_id}
+    except Exception as e:
+        print(f"Report store error: {e}")
+
+    return report
+
+@app.get("/api/reports/{report_id}")
+def get_report(report_id: int):
+    report = store.get(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
+
+@app.get("/api/companies/{company}/trend")
+def get_company_trend(
+    company: str,
+    backend: Optional[str] = None,
+    prompt_version: Optional[str] = None,
+    limit: int = 40
+):
+    trend = store.trend(company, backend=backend, prompt_version=prompt_version, limit=limit)
+    return {"company": company, "count": len(trend), "trend": trend}
+
+@app.get("/api/periods/{fiscal_period}/ranking")
+def get_period_ranking(
+    fiscal_period: str,
+    n: int = 10,
+    order: str = "top",
+    backend: Optional[str] = None,
+    prompt_version: Optional[str] = None
+):
+    if order not in ("top", "bottom"):
+        raise HTTPException(status_code=400, detail="order must be 'top' or 'bottom'")
+    reports = store.ranked(
+        fiscal_period, n=min(n, 1000), bottom=order == "bottom",
+        backend=backend, prompt_version=prompt_version
+    )
+    return {"fiscal_period": fiscal_period, "order": order, "count": len(reports), "reports": reports}
+
+@app.post("/api/rescore")
+def rescore_reports(request: RescoreRequest):
+    # Recomputes consensus for stored reports from their agent scores; no model calls
+    if request.order not in ("top", "bottom"):
+        raise HTTPException(status_code=400, detail="order must be 'top' or 'bottom'")
+    default_weights = {spec.report_key: spec.weight for spec in AGENT_REGISTRY.values()}
+    weight_sets = {"default": default_weights, **(request.weight_sets or {})}
+    for name, weights in weight_sets.items():
+        unknown = set(weights) - set(default_weights)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown sections in weight set '{name}': {sorted(unknown)}")
+        if any(w < 0 for w in weights.values()) or not any(weights.values()):
+            raise HTTPException(status_code=400, detail=f"Weight set '{name}' needs non-negative weights, not all zero")
+    if request.apply and request.apply not in weight_sets:
+        raise HTTPException(status_code=400, detail=f"Unknown weight set '{request.apply}'")
+
+    started = time.perf_counter()
+    matrix = load_score_matrix(
+        list(default_weights), request.fiscal_period, request.backend, request.prompt_version
+    )
+    loaded = time.perf_counter()
+    rankings = {
+        name: matrix.rank(weights, n=min(request.n, 1000), bottom=request.order == "bottom")
+        for name, weights in weight_sets.items()
+    }
+    scored = time.perf_counter()
+
+    applied = 0
+    if request.apply:
+        applied = store.update_consensus(matrix.updates(weight_sets[request.apply]))
+        # Stored scores changed, so cached matrices would report stale ones
+        score_matrices.clear()
+    return {
+        "fiscal_period": request.fiscal_period,
+        "order": request.order,
+        "reports": len(matrix),
+        "weight_sets": weight_sets,
+        "rankings": rankings,
+        "applied": {"weight_set": request.apply, "updated": applied} if request.apply else None,
+        "ms": {
+            "load": round((loaded - started) * 1000, 2),
+            "score": round((scored - loaded) * 1000, 2)
+        }
+    }
+
+def main():
     import uvicorn
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
     print("AI Middleware Server Started...")
-    print("Listening for frontend requests on http://0.0.0.0:8001")
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    print(f"Listening for frontend requests on http://0.0.0.0:8001 ({workers} worker(s))")
+    if workers > 1:
+        # Multiple workers need an import string so each process builds its own app
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
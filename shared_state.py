@@ -0,0 +1,118 @@
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from sqlite_local import LocalConnection
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flights (
+    key TEXT PRIMARY KEY,
+    owner_pid INTEGER NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedState:
+    # Cross-process result cache, single-flight leases and counters in one SQLite (WAL) file
+
+    def __init__(self, path: str = "shared_state.db", stale_after: float = 300.0, purge_every: float = 600.0):
+        self.path = path
+        self.stale_after = stale_after
+        # Expired cache rows are deleted by cache_put at most once per purge_every seconds
+        self.purge_every = purge_every
+        self._last_purge = 0.0
+        # Autocommit; explicit BEGIN IMMEDIATE where a read-modify-write must be atomic
+        self._connect = LocalConnection(path, autocommit=True)
+        self._connect().executescript(SCHEMA)
+
+    # Result cache
+
+    def cache_get(self, key: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT value FROM result_cache WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def cache_put(self, key: str, value: Dict, ttl: float):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl)
+        )
+        if time.time() - self._last_purge >= self.purge_every:
+            self._last_purge = time.time()
+            self.cache_purge()
+
+    def cache_purge(self) -> int:
+        return self._connect().execute(
+            "DELETE FROM result_cache WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+
+    # Single-flight leases
+
+    def try_acquire(self, key: str) -> bool:
+        conn = self._connect()
+        pid = os.getpid()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner_pid, started_at FROM flights WHERE key = ?", (key,)).fetchone()
+            if row:
+                owner_pid, started_at = row
+                # Take over leases from dead workers or analyses that overran
+                if pid_alive(owner_pid) and time.time() - started_at < self.stale_after:
+                    conn.execute("COMMIT")
+                    return False
+            conn.execute(
+                "INSERT OR REPLACE INTO flights (key, owner_pid, started_at) VALUES (?, ?, ?)",
+                (key, pid, time.time())
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, key: str):
+        self._connect().execute(
+            "DELETE FROM flights WHERE key = ? AND owner_pid = ?", (key, os.getpid())
+        )
+
+    def in_flight(self, key: str) -> bool:
+        row = self._connect().execute(
+            "SELECT owner_pid, started_at FROM flights WHERE key = ?", (key,)
+        ).fetchone()
+        return bool(row) and pid_alive(row[0]) and time.time() - row[1] < self.stale_after
+
+    # Metrics
+
+    def incr(self, name: str, amount: float = 1):
+        self._connect().execute(
+            "INSERT INTO metrics (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def metrics(self) -> Dict[str, float]:
+        rows = self._connect().execute("SELECT name, value FROM metrics ORDER BY name").fetchall()
+        return {name: value for name, value in rows}
@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import re
+from typing import Awaitable, Callable, Dict, Optional
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def content_key(text: Optional[str] = None, data: Optional[bytes] = None) -> str:
+    # Whitespace-insensitive hash so re-submitted copies of a transcript share a key
+    digest = hashlib.sha256()
+    if text:
+        digest.update(WHITESPACE_RE.sub(" ", text).strip().encode())
+    digest.update(b"\0")
+    if data:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class Flight:
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight(asyncio.ensure_future(fn()))
+            self.flights[key] = flight
+            self.started += 1
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            # shield: one waiter going away must not cancel the shared computation
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                flight.task.cancel()
+                self._forget(key, flight)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self.flights),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,28 @@
+import sqlite3
+import threading
+
+
+class LocalConnection:
+    # One SQLite connection per thread (executor threads included) in WAL mode, so readers
+    # run alongside the writer; call it to get the current thread's connection
+
+    def __init__(self, path: str, autocommit: bool = False, row_factory=None, timeout: float = 30):
+        self.path = path
+        self.autocommit = autocommit
+        self.row_factory = row_factory
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.autocommit:
+                conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            else:
+                conn = sqlite3.connect(self.path, timeout=self.timeout)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
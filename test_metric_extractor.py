@@ -0,0 +1,60 @@
+from metric_extractor import extract_metrics, format_money, to_key_metrics
+
+# (transcript, expected to_key_metrics subset; None = metric must not be extracted)
+CASES = [
+    ("Sales and marketing expense was $500 million. Total revenue was $2.8 billion, up 12% year-over-year.",
+     {"revenue": "$2.8B (up 12% YoY)"}),
+    ("Our revenue guidance remains unchanged. Net income was $400 million.",
+     {"revenue": None, "guidance": None, "net_income": "$400M"}),
+    ("Gross margin expanded. Operating expenses rose 8%.",
+     {"gross_margin": None}),
+    ("Revenue grew 15% to $4.1 billion.",
+     {"revenue": "$4.1B (up 15%)"}),
+    ("For Q4 we expect revenue of $3.4 billion.",
+     {"guidance": "$3.4B", "revenue": None}),
+    ("Revenue guidance for next year is $12 billion.",
+     {"guidance": "$12B", "revenue": None}),
+    ("Gross margin was 68%, down from 71% last quarter vs. plan.",
+     {"gross_margin": "68% (down from 71%)"}),
+    # Signs: wording, minus and accounting parentheses
+    ("Free cash flow was negative $50 million.",
+     {"free_cash_flow": "-$50M"}),
+    ("Free cash flow was -$20 million this quarter.",
+     {"free_cash_flow": "-$20M"}),
+    ("Net income was $(45) million.",
+     {"net_income": "-$45M"}),
+    ("Net income was ($45) million.",
+     {"net_income": "-$45M"}),
+    ("Net loss was $30 million, narrower than last year.",
+     {"net_income": "-$30M"}),
+    ("Free cash flow reflected an outflow of $75 million.",
+     {"free_cash_flow": "-$75M"}),
+    # Precision
+    ("Revenue was $812.5 million.",
+     {"revenue": "$812.5M"}),
+    ("Revenue was $1,234 million.",
+     {"revenue": "$1.234B"}),
+]
+
+
+def test_regression_cases():
+    failures = []
+    for text, expected in CASES:
+        found = to_key_metrics(extract_metrics(text))
+        for name, value in expected.items():
+            if found.get(name) != value:
+                failures.append(f"{text!r}: {name} = {found.get(name)!r}, expected {value!r}")
+    assert not failures, "\n".join(failures)
+
+
+def test_format_money():
+    assert format_money(812.5e6) == "$812.5M"
+    assert format_money(1.234e9) == "$1.234B"
+    assert format_money(-50e6) == "-$50M"
+    assert format_money(950) == "$950"
+
+
+if __name__ == "__main__":
+    test_regression_cases()
+    test_format_money()
+    print(f"{len(CASES)} extractor cases passed")
@@ -0,0 +1,179 @@
+import os
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+TIKTOKEN_AVAILABLE = False
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+    TIKTOKEN_AVAILABLE = True
+except Exception:
+    pass
+
+PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        return len(_ENCODING.encode(text))
+    # Close to BPE counts for English prose: long words split into several tokens
+    return sum(1 + len(piece) // 8 for piece in PIECE_RE.findall(text))
+
+
+def fit_text(text: str, max_tokens: int) -> str:
+    # Truncate to roughly max_tokens using the text's own chars-per-token ratio
+    if not text or max_tokens <= 0:
+        return ""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    cut = int(len(text) * max_tokens / total)
+    return text[:cut]
+
+
+# Prior output sizes for each agent's JSON schema, used until calls are observed
+SCHEMA_OUTPUT_TOKENS = {
+    "revenue_agent": 450,
+    "profitability_agent": 400,
+    "management_agent": 450,
+    "revise": 500,
+}
+
+# Rough prefill / decode throughput per backend (tokens per second), refined from observations
+BACKEND_THROUGHPUT = {
+    "claude": {"input": 5000.0, "output": 60.0},
+    "ollama": {"input": 400.0, "output": 25.0},
+    "mock": {"input": 1e9, "output": 1e9},
+}
+
+
+@dataclass
+class BudgetConfig:
+    # Wall-clock target for one agent call, and a cost cap on its input
+    target_seconds: float = 20.0
+    max_input_tokens: int = 1500
+    # ~3000 characters, the excerpt agents were always sent; lower it only deliberately
+    min_input_tokens: int = 750
+    min_output_tokens: int = 200
+    max_output_tokens: int = 3000
+    # Headroom over the observed p95 output length
+    output_margin: float = 1.3
+    window: int = 50
+
+    @classmethod
+    def from_env(cls) -> "BudgetConfig":
+        defaults = cls()
+        return cls(
+            target_seconds=float(os.environ.get("TOKEN_TARGET_SECONDS", defaults.target_seconds)),
+            max_input_tokens=int(os.environ.get("TOKEN_MAX_INPUT", defaults.max_input_tokens)),
+            min_input_tokens=int(os.environ.get("TOKEN_MIN_INPUT", defaults.min_input_tokens)),
+            max_output_tokens=int(os.environ.get("TOKEN_MAX_OUTPUT", defaults.max_output_tokens)),
+        )
+
+
+class AgentUsage:
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.truncated = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.recent_outputs: Deque[int] = deque(maxlen=window)
+        self.bump = 1.0
+
+    def median_output(self) -> Optional[int]:
+        if not self.recent_outputs:
+            return None
+        ordered = sorted(self.recent_outputs)
+        return ordered[len(ordered) // 2]
+
+    def p95_output(self) -> Optional[int]:
+        if not self.recent_outputs:
+            return None
+        ordered = sorted(self.recent_outputs)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class TokenBudgetPlanner:
+
+    def __init__(self, backend: str = "mock", config: BudgetConfig = None):
+        self.backend = backend
+        self.config = config or BudgetConfig.from_env()
+        self.throughput = dict(BACKEND_THROUGHPUT.get(backend, BACKEND_THROUGHPUT["claude"]))
+        self.usage: Dict[str, AgentUsage] = {}
+
+    def _usage(self, key: str) -> AgentUsage:
+        if key not in self.usage:
+            self.usage[key] = AgentUsage(self.config.window)
+        return self.usage[key]
+
+    def max_tokens(self, key: str) -> int:
+        usage = self._usage(key)
+        observed = usage.p95_output()
+        prior = SCHEMA_OUTPUT_TOKENS.get(key.split(":")[-1], SCHEMA_OUTPUT_TOKENS.get(key, 500))
+        size = observed * self.config.output_margin if observed else prior
+        size *= usage.bump
+        return int(max(self.config.min_output_tokens, min(self.config.max_output_tokens, size)))
+
+    def input_tokens(self, key: str, prompt: str = "") -> int:
+        # Whatever the latency target leaves after a typical reply goes to the document excerpt;
+        # max_tokens is a ceiling with headroom, not what the agent usually generates
+        expected = self._usage(key).median_output()
+        if expected is None:
+            expected = SCHEMA_OUTPUT_TOKENS.get(key.split(":")[-1], SCHEMA_OUTPUT_TOKENS.get(key, 500))
+        generation_seconds = expected / self.throughput["output"]
+        spare = max(0.0, self.config.target_seconds - generation_seconds)
+        budget = int(spare * self.throughput["input"]) - count_tokens(prompt)
+        return max(self.config.min_input_tokens, min(self.config.max_input_tokens, budget))
+
+    def fit_document(self, key: str, prompt: str, document_text: str) -> str:
+        return fit_text(document_text, self.input_tokens(key, prompt))
+
+    def record(
+        self,
+        key: str,
+        input_tokens: int,
+        output_tokens: int,
+        seconds: float = None,
+        truncated: bool = False
+    ):
+        usage = self._usage(key)
+        usage.calls += 1
+        usage.input_tokens += input_tokens
+        usage.output_tokens += output_tokens
+        usage.recent_outputs.append(output_tokens)
+        if truncated:
+            # The reply was cut off; give this agent more room next time
+            usage.truncated += 1
+            usage.bump = min(usage.bump * 1.5, 4.0)
+        else:
+            usage.bump = max(1.0, usage.bump * 0.9)
+
+        if seconds and output_tokens and self.backend != "mock":
+            # Decode time is the call minus the prompt's prefill at the input rate
+            decode_seconds = seconds - input_tokens / self.throughput["input"]
+            if decode_seconds > 0:
+                observed = output_tokens / decode_seconds
+                self.throughput["output"] = 0.8 * self.throughput["output"] + 0.2 * observed
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "output_tokens_per_second": round(self.throughput["output"], 1),
+            "agents": {
+                key: {
+                    "calls": usage.calls,
+                    "avg_input_tokens": round(usage.input_tokens / usage.calls) if usage.calls else 0,
+                    "avg_output_tokens": round(usage.output_tokens / usage.calls) if usage.calls else 0,
+                    "p95_output_tokens": usage.p95_output(),
+                    "truncated": usage.truncated,
+                    "max_tokens": self.max_tokens(key),
+                    "input_budget": self.input_tokens(key)
+                }
+                for key, usage in self.usage.items()
+            }
+        }
@@ -0,0 +1,310 @@
+import bisect
+import re
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Tuple
+
+# Phrase lexicon per tone category (matched case-insensitively on word boundaries)
+LEXICON = {
+    "confidence": [
+        "confident", "confidence", "excited", "pleased", "proud", "record", "strong",
+        "momentum", "outperform", "accelerate", "accelerating", "well positioned",
+        "very well positioned", "ahead of plan", "exceeded", "robust", "clear visibility",
+        "we are on track", "we're on track", "committed", "optimistic", "raised guidance",
+    ],
+    "hedging": [
+        "might", "could", "possibly", "perhaps", "approximately", "we believe",
+        "we think", "we hope", "somewhat", "uncertain", "uncertainty", "cautious",
+        "cautiously", "headwinds", "macroeconomic headwinds", "challenging environment",
+        "softness", "volatility", "difficult to predict", "subject to", "going forward",
+        "it depends", "to some extent",
+    ],
+    "evasiveness": [
+        "we don't disclose", "we do not disclose", "we don't break out", "we don't break that out",
+        "not going to comment", "can't comment", "cannot comment", "won't comment",
+        "too early to say", "too early to tell", "we'll have more to say", "we will share more",
+        "not in a position to", "i'd rather not", "as i said", "as i mentioned",
+        "let me take that offline", "we don't provide", "we do not provide", "we'll see",
+        "i won't speculate", "not going to speculate", "i don't want to get ahead",
+    ],
+}
+
+QA_START_RE = re.compile(
+    r'question[- ]and[- ]answer|\bq\s?&\s?a\b|operator:.*(?:first question|open the line)',
+    re.IGNORECASE
+)
+SPEAKER_RE = re.compile(r"^[ \t]*([A-Z][\w .,'&-]{0,40}?)[ \t]*(?:-[ \t]*[\w ,&]{0,40})?:", re.MULTILINE)
+WORD_RE = re.compile(r"\w+")
+# Speaker labels that identify (or rule out) company management
+MANAGEMENT_RE = re.compile(
+    r'\b(?:ceo|cfo|coo|cto|president|chief|officer|chair(?:man|woman)?|founder|treasurer|investor relations)\b',
+    re.IGNORECASE
+)
+NON_MANAGEMENT_RE = re.compile(r'\b(?:operator|analyst|moderator)\b', re.IGNORECASE)
+# Densities are shrunk towards neutral as if this many phrase-free words were added,
+# so a short excerpt cannot reach the ends of the 0-10 scale on a handful of phrases
+PRIOR_WORDS = 1000
+
+AHOCORASICK_AVAILABLE = False
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    pass
+
+
+class PhraseMatcher:
+    # Aho-Corasick automaton: every phrase is found in one pass over the text
+
+    def __init__(self, lexicon: Dict[str, List[str]]):
+        self.categories: Dict[str, str] = {}
+        for category, phrases in lexicon.items():
+            for phrase in phrases:
+                self.categories[phrase.lower()] = category
+
+        if AHOCORASICK_AVAILABLE:
+            self.automaton = ahocorasick.Automaton()
+            for phrase in self.categories:
+                self.automaton.add_word(phrase, phrase)
+            self.automaton.make_automaton()
+        else:
+            self._build(list(self.categories))
+
+    def _build(self, phrases: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+
+        for phrase in phrases:
+            state = 0
+            for char in phrase:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(phrase)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def _raw_matches(self, text: str):
+        if AHOCORASICK_AVAILABLE:
+            for end, phrase in self.automaton.iter(text):
+                yield end, phrase
+            return
+
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for phrase in output[state]:
+                yield index, phrase
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        # Returns (start offset, phrase) for whole-word matches
+        lowered = text.lower()
+        length = len(lowered)
+        matches = []
+        for end, phrase in self._raw_matches(lowered):
+            start = end - len(phrase) + 1
+            if start > 0 and lowered[start - 1].isalnum():
+                continue
+            if end + 1 < length and lowered[end + 1].isalnum():
+                continue
+            matches.append((start, phrase))
+
+        # Keep leftmost-longest matches so "macroeconomic headwinds" isn't also counted as "headwinds"
+        matches.sort(key=lambda m: (m[0], -len(m[1])))
+        kept, covered_until = [], -1
+        for start, phrase in matches:
+            if start < covered_until:
+                continue
+            kept.append((start, phrase))
+            covered_until = start + len(phrase)
+        return kept
+
+
+MATCHER = PhraseMatcher(LEXICON)
+
+
+def _speaker_index(text: str) -> Tuple[List[int], List[str], List[str]]:
+    offsets, names, labels = [], [], []
+    for match in SPEAKER_RE.finditer(text):
+        offsets.append(match.start())
+        names.append(match.group(1).strip())
+        labels.append(match.group(0))
+    return offsets, names, labels
+
+
+def _management_speakers(offsets: List[int], names: List[str], labels: List[str], qa_start: int) -> set:
+    # Management gives the prepared remarks or carries an executive title; analysts only show up in Q&A
+    management = set()
+    for offset, name, label in zip(offsets, names, labels):
+        if NON_MANAGEMENT_RE.search(label):
+            continue
+        if offset < qa_start or MANAGEMENT_RE.search(label):
+            management.add(name)
+    return management
+
+
+def analyze_tone(text: str) -> Dict:
+    if not text:
+        return {}
+
+    matches = MATCHER.find(text)
+    offsets, names, labels = _speaker_index(text)
+    qa_match = QA_START_RE.search(text)
+    qa_start = qa_match.start() if qa_match else len(text)
+    management = _management_speakers(offsets, names, labels, qa_start)
+
+    # Densities describe management's language; analyst questions ("could you...", "as I said")
+    # and operator lines don't count. A transcript without speaker labels counts whole
+    def is_management(turn: int) -> bool:
+        return not offsets or (turn >= 0 and names[turn] in management)
+
+    if offsets:
+        ends = offsets[1:] + [len(text)]
+        words = sum(
+            len(WORD_RE.findall(text[offset + len(label):end]))
+            for offset, end, name, label in zip(offsets, ends, names, labels) if name in management
+        )
+    else:
+        words = len(WORD_RE.findall(text))
+    words = max(words, 1)
+
+    phrase_counts = Counter()
+    category_counts = Counter()
+    speaker_counts: Dict[str, Counter] = defaultdict(Counter)
+    qa_counts = Counter()
+    deflecting_answers = set()
+
+    for start, phrase in matches:
+        category = MATCHER.categories[phrase]
+        turn = bisect.bisect_right(offsets, start) - 1
+        if is_management(turn):
+            phrase_counts[phrase] += 1
+            category_counts[category] += 1
+        if turn >= 0:
+            speaker_counts[names[turn]][phrase] += 1
+        if start >= qa_start:
+            qa_counts[category] += 1
+            # Only management answers count as deflections, not analyst questions
+            if category == "evasiveness" and turn >= 0 and offsets[turn] >= qa_start and names[turn] in management:
+                deflecting_answers.add(turn)
+
+    per_k = {c: round(1000 * category_counts[c] / words, 2) for c in LEXICON}
+    qa_turns = max(sum(
+        1 for offset, name in zip(offsets, names) if offset >= qa_start and name in management
+    ), 1)
+    evidence = words / (words + PRIOR_WORDS)
+
+    # 0-10, driven by evasive phrases, hedging density and Q&A deflections
+    defensiveness_score = round(evidence * (
+        2.0 * per_k["evasiveness"]
+        + 0.15 * per_k["hedging"]
+        + 4.0 * len(deflecting_answers) / qa_turns
+        - 0.05 * per_k["confidence"]
+    ), 1)
+    defensiveness_score = max(0.0, min(10.0, defensiveness_score))
+    if defensiveness_score >= 6.0:
+        defensiveness = "High"
+    elif defensiveness_score >= 3.0:
+        defensiveness = "Medium"
+    else:
+        defensiveness = "Low"
+
+    net_tone = evidence * (per_k["confidence"] - 0.5 * per_k["hedging"] - 2 * per_k["evasiveness"])
+    if net_tone >= 5:
+        tone = "Bullish and confident"
+    elif net_tone >= 0:
+        tone = "Measured"
+    else:
+        tone = "Cautious and hedged"
+
+    return {
+        "words": words,
+        "category_counts": dict(category_counts),
+        "per_1000_words": per_k,
+        "phrase_counts": dict(phrase_counts.most_common()),
+        "speaker_counts": {name: dict(counts.most_common(5)) for name, counts in speaker_counts.items()},
+        "qa_counts": dict(qa_counts),
+        "qa_deflections": len(deflecting_answers),
+        "defensiveness_score": defensiveness_score,
+        "defensiveness": defensiveness,
+        "tone": tone,
+        "score": round(max(0.0, min(10.0, 6.5 + 0.15 * net_tone - 0.3 * defensiveness_score)), 1),
+    }
+
+
+def _top_phrases(tone: Dict, category: str, limit: int = 3) -> List[Tuple[str, int]]:
+    return [
+        (phrase, count) for phrase, count in tone.get("phrase_counts", {}).items()
+        if MATCHER.categories.get(phrase) == category
+    ][:limit]
+
+
+def _speaker_mentions(tone: Dict, category: str, limit: int = 2) -> List[str]:
+    lines = []
+    for speaker, counts in tone.get("speaker_counts", {}).items():
+        used = [f"'{p}' {n} times" for p, n in counts.items() if MATCHER.categories.get(p) == category]
+        if used:
+            lines.append(f"{speaker} used " + ", ".join(used[:limit]))
+    return lines
+
+
+def prompt_context(tone: Dict) -> str:
+    if not tone:
+        return ""
+    confident = ", ".join(f"'{p}' x{n}" for p, n in _top_phrases(tone, "confidence")) or "none"
+    hedging = ", ".join(f"'{p}' x{n}" for p, n in _top_phrases(tone, "hedging")) or "none"
+    evasive = ", ".join(f"'{p}' x{n}" for p, n in _top_phrases(tone, "evasiveness")) or "none"
+    return (
+        "\n\nExact lexical counts (computed locally, treat as facts):\n"
+        f"- confidence phrases: {confident}\n"
+        f"- hedging phrases: {hedging}\n"
+        f"- evasive phrases: {evasive}\n"
+        f"- Q&A answers with deflections: {tone['qa_deflections']}\n"
+        f"- defensiveness: {tone['defensiveness']} ({tone['defensiveness_score']}/10)"
+    )
+
+
+def to_analysis(tone: Dict) -> Dict:
+    # Stand-in for the model's ManagementAgent output
+    score = tone.get("score", 7.0)
+    if score >= 7.5:
+        verdict = "CONFIDENT"
+    elif score >= 6.0:
+        verdict = "NEUTRAL"
+    else:
+        verdict = "CAUTIOUS"
+
+    positive = _speaker_mentions(tone, "confidence") or [
+        f"Used '{p}' {n} times" for p, n in _top_phrases(tone, "confidence")
+    ]
+    red_flags = [f"Mentioned '{p}' {n} times" for p, n in _top_phrases(tone, "hedging")]
+    red_flags += [f"Evasive phrase '{p}' used {n} times" for p, n in _top_phrases(tone, "evasiveness")]
+    if tone.get("qa_deflections"):
+        red_flags.append(f"Deflected {tone['qa_deflections']} analyst question(s) in Q&A")
+
+    return {
+        "score": score,
+        "verdict": verdict,
+        "key_metrics": {
+            "tone": tone.get("tone", "Measured"),
+            "defensiveness": tone.get("defensiveness", "Low"),
+            "transparency": f"{round(10 - tone.get('defensiveness_score', 0), 1)}/10"
+        },
+        "positive_signals": positive[:4] or ["No strong confidence language detected"],
+        "red_flags": red_flags[:4]
+    }
@@ -0,0 +1,75 @@
+import glob
+import os
+import time
+from typing import Dict, List
+
+from metric_extractor import extract_metrics
+from tone_analyzer import analyze_tone
+from call_scheduler import call_context
+from Earnings_Call_Analyzer import clean_ollama_json, safe_json_parse
+
+WARMUP_TRANSCRIPT = """
+Q3 2025 Earnings Call - Warmup Corp.
+CEO: We are confident. Revenue was $1.2 billion, up 10% year-over-year.
+CFO: Gross margin was 60%, down from 62%. Free cash flow was $200 million.
+Operator: We will now begin the question-and-answer session.
+CEO: We don't break that out, but we may see headwinds.
+"""
+
+
+def replay_paths(spec: str) -> List[str]:
+    # WARMUP_REPLAY: comma-separated files, directories or globs of .txt transcripts
+    paths = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        if os.path.isdir(part):
+            paths.extend(sorted(glob.glob(os.path.join(part, "*.txt"))))
+        else:
+            paths.extend(sorted(glob.glob(part)))
+    return paths
+
+
+async def warm_up(analyzer, replay: List[str] = (), replay_limit: int = 20) -> Dict:
+    status = {"steps": {}, "errors": {}}
+
+    async def step(name: str, fn):
+        started = time.perf_counter()
+        try:
+            result = await fn()
+            status["steps"][name] = {"seconds": round(time.perf_counter() - started, 3), "result": result}
+        except Exception as e:
+            # A failed step leaves the server usable, just not pre-warmed
+            print(f"  Warm-up step '{name}' failed: {e}")
+            status["errors"][name] = str(e)
+
+    async def load_model():
+        await analyzer.ai_api.warm_up()
+        return analyzer.ai_api.backend
+
+    async def compile_patterns():
+        # Exercise every precompiled pattern set (and the re module cache) once
+        extract_metrics(WARMUP_TRANSCRIPT)
+        analyze_tone(WARMUP_TRANSCRIPT)
+        safe_json_parse(clean_ollama_json('```json\n{"score": 7.5, "margin": 72%}\n```'), "revenue", analyzer.ai_api)
+        return True
+
+    async def load_samples():
+        return analyzer.samples.preload()
+
+    async def replay_transcripts():
+        replayed = 0
+        for path in list(replay)[:replay_limit]:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+            # Replay must not hold model slots that early interactive requests need
+            with call_context("warmup", "batch"):
+                await analyzer.analyze_document(text_content=text)
+            replayed += 1
+        return replayed
+
+    await step("model", load_model)
+    await step("patterns", compile_patterns)
+    await step("samples", load_samples)
+    if replay:
+        await step("replay", replay_transcripts)
+
+    return status